@@ -1,20 +1,28 @@
-from collections.abc import Callable
+from asyncio import Task, create_task, get_running_loop
+from collections.abc import Awaitable, Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from copy import deepcopy
 from functools import partial
 from html import unescape
+from io import BytesIO
 from json import JSONDecodeError, dumps, loads
-from urllib.parse import parse_qs, unquote, urlparse
+from urllib.parse import ParseResult, parse_qs, unquote, urlparse
 
 from curl_cffi import CurlError
+from langid.langid import load_model as load_langid_model
 
-from lib import logger
+from lib import Thread, close_async_session, logger
 from lib.archives import archive_org_data, archive_today_data
+from lib.blocking import asgi_executor, run_blocking, run_store_io
+from lib.cache import new_cache
 from lib.commons import (
     ReturnError,
     data_to_sfn_cit_ref,
     isbn_10or13_search,
     uninum2en,
 )
-from lib.doi import doi_data, doi_search
+from lib.deadline import Deadline, deadline_scope, skipped_enrichments
+from lib.doi import async_doi_data, doi_data, doi_search
 from lib.googlebooks import google_books_data
 from lib.html import (
     ALLOW_ALL_ORIGINS,
@@ -23,17 +31,35 @@ from lib.html import (
     JS_HEADERS,
     JS_PATH,
     css,
-    default_scr,
     js,
     scr_to_html,
+    shell_response,
 )
 from lib.isbn_oclc import isbn_data, oclc_data, worldcat_data
 from lib.jstor import jstor_data
 from lib.ketabir import ketabir_data
+from lib.metrics import (
+    Counter,
+    Histogram,
+    caches,
+    flights,
+    render as render_metrics,
+)
 from lib.noorlib import noorlib_data
 from lib.noormags import noormags_data
-from lib.pubmed import pmcid_data, pmid_data
-from lib.urls import MAX_RESPONSE_LENGTH, url_data, url_text
+from lib.prewarm import (
+    start_async_prewarming,
+    start_prewarming,
+    stop_prewarming,
+)
+from lib.pubmed import (
+    async_pmcid_data,
+    async_pmid_data,
+    pmcid_data,
+    pmid_data,
+)
+from lib.singleflight import SingleFlight
+from lib.urls import MAX_RESPONSE_LENGTH, async_url_data, url_data, url_text
 
 
 def google_encrypted_data(url, parsed_url) -> dict:
@@ -70,54 +96,158 @@ json_headers = (
     ('Content-Type', 'application/json'),
     ALLOW_ALL_ORIGINS,
 )
+ndjson_headers = (
+    ('Content-Type', 'application/x-ndjson'),
+    # ask reverse proxies to pass each line through as soon as it is ready
+    ('X-Accel-Buffering', 'no'),
+    ALLOW_ALL_ORIGINS,
+)
 
 
 def html_data(user_input: dict):
     return url_data(user_input['url'], html=user_input['html'])
 
 
-def url_doi_isbn_data(user_input: str, /) -> dict:
+def url_data_thread_target(url: str, result: list) -> None:
+    try:
+        result.append(url_data(url))
+    except Exception as e:
+        result.append(e)
+
+
+# Labelled with the get_resolver key for known hosts, otherwise with the
+# generic path that handled the input.
+RESOLVER_SECONDS = Histogram(
+    'citer_resolver_duration_seconds',
+    'Time spent in url_doi_isbn_data by resolver.',
+    ('resolver',),
+)
+
+
+def input_url(user_input: str, /) -> tuple[bool, str, ParseResult, str]:
+    """Return (url_input, url, parsed_url, hostname_core) of user_input."""
+    if not (url_input := user_input.startswith('http')):
+        url = 'http://' + user_input
+    else:
+        url = user_input
+    parsed_url = urlparse(url)
+    hostname_core = parsed_url[1].rpartition('.')[0].removeprefix('www.')
+    return url_input, url, parsed_url, hostname_core
+
+
+def _url_doi_isbn_data(user_input: str, /) -> dict:
     en_user_input = unquote(uninum2en(user_input))
     # Checking the user input for dot is important because
     # the use of dotless domains is prohibited.
     # See: https://features.icann.org/dotless-domains
     if '.' in en_user_input:
         # Try predefined URLs
-        # Todo: The following code could be done in threads.
-        if not (url_input := user_input.startswith('http')):
-            url = 'http://' + user_input
-        else:
-            url = user_input
-        parsed_url = urlparse(url)
-        hostname_core = parsed_url[1].rpartition('.')[0].removeprefix('www.')
+        url_input, url, parsed_url, hostname_core = input_url(user_input)
         # todo: make lazy?
         if (data_func := get_resolver(hostname_core)) is not None:
-            if data_func is google_books_data:
-                return data_func(parsed_url)
-            elif data_func is google_encrypted_data:
-                return data_func(url, parsed_url)
-            return data_func(url)
+            with RESOLVER_SECONDS.time(hostname_core):
+                if data_func is google_books_data:
+                    return data_func(parsed_url)
+                elif data_func is google_encrypted_data:
+                    return data_func(url, parsed_url)
+                return data_func(url)
 
         # DOIs contain dots
         if (m := doi_search(unescape(en_user_input))) is not None:
-            try:
-                return doi_data(m[0], True)
-            except (JSONDecodeError, CurlError):
+            with RESOLVER_SECONDS.time('doi'):
                 if url_input is False:
-                    raise
-                # continue with urls_scr
-
-        return url_data(url)
+                    return doi_data(m[0], True)
+                # Race the URL path against the preferred DOI path so that
+                # a failing DOI does not add the whole URL round-trip chain.
+                # The URL result is ignored if the DOI path succeeds.
+                url_result = []
+                url_thread = Thread(
+                    target=url_data_thread_target, args=(url, url_result)
+                )
+                url_thread.start()
+                try:
+                    return doi_data(m[0], True)
+                except (JSONDecodeError, CurlError):
+                    url_thread.join()
+                    if isinstance(d := url_result[0], Exception):
+                        raise d
+                    return d
+
+        with RESOLVER_SECONDS.time('url'):
+            return url_data(url)
 
     # We can check user inputs containing dots for ISBNs, but that sounds
     # error-prone.
     if (m := isbn_10or13_search(en_user_input)) is not None:
-        return isbn_data(m[0], True)
+        with RESOLVER_SECONDS.time('isbn'):
+            return isbn_data(m[0], True)
 
     raise ValueError('invalid user_input')
 
 
+# Callers mutate the returned dict (see data_to_sfn_cit_ref), so each one
+# that waited on an in-flight resolution gets its own deep copy.
+url_doi_isbn_flight = flights['url_doi_isbn'] = SingleFlight(deepcopy)
+
+
+def url_doi_isbn_data(user_input: str, /) -> dict:
+    return url_doi_isbn_flight.do(user_input, _url_doi_isbn_data, user_input)
+
+
+def retrieve_exception(task: Task) -> None:
+    """Mark the exception of an abandoned task as retrieved, unlogged."""
+    if not task.cancelled():
+        task.exception()
+
+
+async def _async_url_doi_isbn_data(user_input: str, /) -> dict:
+    en_user_input = unquote(uninum2en(user_input))
+    if '.' not in en_user_input:
+        return await run_blocking(url_doi_isbn_data, user_input)
+    url_input, url, _, hostname_core = input_url(user_input)
+    if get_resolver(hostname_core) is not None:
+        return await run_blocking(url_doi_isbn_data, user_input)
+
+    if (m := doi_search(unescape(en_user_input))) is not None:
+        with RESOLVER_SECONDS.time('doi'):
+            if url_input is False:
+                return await async_doi_data(m[0], True)
+            # race the URL path against the DOI path, see _url_doi_isbn_data
+            url_task = create_task(async_url_data(url))
+            try:
+                return await async_doi_data(m[0], True)
+            except (JSONDecodeError, CurlError):
+                return await url_task
+            finally:
+                url_task.cancel()
+                # it may still fail while being cancelled, e.g. in cleanup
+                url_task.add_done_callback(retrieve_exception)
+
+    with RESOLVER_SECONDS.time('url'):
+        return await async_url_data(url)
+
+
+async def async_url_doi_isbn_data(user_input: str, /) -> dict:
+    """Like url_doi_isbn_data, without a thread for DOIs and other URLs.
+
+    Inputs of hosts in get_resolver and ISBNs are resolved on a thread.
+    """
+    return await url_doi_isbn_flight.async_do(
+        user_input, _async_url_doi_isbn_data, user_input
+    )
+
+
+# Resolvers that the ASGI app awaits on its event loop instead of running
+# them on asgi_executor.
+async_resolvers: dict[Callable, Callable[[str], Awaitable[dict]]] = {
+    url_doi_isbn_data: async_url_doi_isbn_data,
+    pmid_data: async_pmid_data,
+    pmcid_data: async_pmcid_data,
+}
+
+
 BytesTuple = tuple[bytes]
+BytesIterable = BytesTuple | Iterator[bytes]
 StartResponse = Callable[[str, list[tuple[str, str]]], Callable]
 
 
@@ -168,24 +298,62 @@ def read_body(environ: dict, /) -> bytes:
     return environ['wsgi.input'].read(length)
 
 
+BATCH_MAX_ITEMS = 100
+BATCH_MAX_WORKERS = 10
+
+
+class InvalidBatchError(ValueError):
+    """Raise when the user_input of a batch request is invalid."""
+
+
+def batch_items(items: list[dict]) -> list[tuple[str, str | dict]]:
+    """Convert a list of {input_type, user_input} dicts to tuples."""
+    if type(items) is not list:
+        raise InvalidBatchError('batch user_input should be a list')
+    if len(items) > BATCH_MAX_ITEMS:
+        raise InvalidBatchError(
+            f'a batch may have at most {BATCH_MAX_ITEMS} items'
+        )
+    batch = []
+    for i, item in enumerate(items):
+        if (
+            type(item) is not dict
+            or type(input_type := item.get('input_type', '')) is not str
+            or type(user_input := item.get('user_input')) not in (str, dict)
+            or not user_input
+        ):
+            raise InvalidBatchError(
+                f'batch item {i} should be an object with a user_input'
+            )
+        batch.append((input_type, user_input))
+    return batch
+
+
 def parse_params(
     environ: dict,
 ) -> tuple[
     str,
     str,
     str,
-    str | dict,  # user_input is dict when input_type == html
+    # user_input is dict when input_type == html and
+    # a list of (input_type, user_input) tuples when input_type == batch
+    str | dict | list[tuple[str, str | dict]],
     list[tuple[str, str]],
     Callable[[tuple[str, str, str]], str],
 ]:
     body = read_body(environ)
     if body:
         get = loads(body).get
+        input_type = get('input_type', '')
+        # string user_input is trimmed in common.js
+        user_input = get('user_input', '')
+        if input_type == 'batch':
+            user_input = batch_items(user_input)
         return (
             get('dateformat') or '%Y-%m-%d',
             get('pipeformat') or ' | ',
-            get('input_type', ''),
-            get('user_input', ''),  # string user_input is trimmed in common.js
+            input_type,
+            user_input,
             [*json_headers],
             dumps,
         )
@@ -210,82 +378,326 @@ def parse_params(
     )
 
 
-def root(start_response: StartResponse, environ: dict) -> BytesTuple:
+DAY = 86400
+RESOLVER_CACHE_SIZE = 2000
+
+
+def isbn_or_url_key(user_input: str) -> str:
+    if '.' in user_input:  # URL or DOI
+        return user_input
+    return user_input.replace('-', '').replace(' ', '').upper()
+
+
+def digits_key(user_input: str) -> str:
+    return ''.join(c for c in user_input if c.isdigit())
+
+
+# Resolvers whose output is cached: resolver -> (TTL in seconds, key_func).
+# The cached value is the resolver's dict, before data_to_sfn_cit_ref, so
+# a hit only needs to re-render with the requested date and pipe formats.
+cached_resolvers: dict[Callable, tuple[float, Callable[[str], str]]] = {
+    url_doi_isbn_data: (DAY, isbn_or_url_key),
+    pmid_data: (30 * DAY, digits_key),
+    pmcid_data: (30 * DAY, digits_key),
+    oclc_data: (30 * DAY, str),
+}
+resolver_cache = caches['resolver'] = new_cache(
+    'resolver', RESOLVER_CACHE_SIZE
+)
+
+
+def resolver_cache_key(
+    data_func: Callable, user_input: str | dict
+) -> tuple[str, float] | None:
+    """Return the cache key and TTL of the result of data_func."""
+    if (ttl_key_func := cached_resolvers.get(data_func)) is None:
+        return None
+    ttl, key_func = ttl_key_func
+    return f'{data_func.__name__}:{key_func(uninum2en(user_input))}', ttl
+
+
+def cache_data(key: str, d: dict, ttl: float, skipped: list[str]) -> None:
+    if skipped:
+        # a result without some enrichments should not be kept for everyone
+        return
+    try:
+        resolver_cache.set(key, d, ttl)
+    except Exception:
+        logger.exception('could not cache %s', key)
+
+
+def cached_data(data_func: Callable, user_input: str | dict) -> dict:
+    if (key_ttl := resolver_cache_key(data_func, user_input)) is None:
+        return data_func(user_input)
+    key, ttl = key_ttl
+    if (d := resolver_cache.get(key)) is not None:
+        return d
+    with skipped_enrichments() as skipped:
+        d = data_func(user_input)
+    cache_data(key, d, ttl, skipped)
+    return d
+
+
+async def async_cached_data(data_func: Callable, user_input: str) -> dict:
+    """Like cached_data, awaiting the async counterpart of data_func."""
+    async_func = async_resolvers[data_func]
+    if (key_ttl := resolver_cache_key(data_func, user_input)) is None:
+        return await async_func(user_input)
+    key, ttl = key_ttl
+    if (d := await run_store_io(resolver_cache.get, key)) is not None:
+        return d
+    with skipped_enrichments() as skipped:
+        d = await async_func(user_input)
+    await run_store_io(cache_data, key, d, ttl, skipped)
+    return d
+
+
+REQUESTS = Counter(
+    'citer_requests_total',
+    'Resolved user inputs, including batch items.',
+    ('input_type', 'status'),
+)
+REQUEST_SECONDS = Histogram(
+    'citer_request_duration_seconds',
+    'Time spent resolving a user input and formatting its output.',
+    ('input_type',),
+)
+
+
+def resolve_scr(
+    input_type: str,
+    user_input: str | dict,
+    date_format: str,
+    pipe_format: str,
+) -> tuple[str, tuple]:
+    """Return (status, scr) for the given user_input."""
+    if (data_func := input_type_to_resolver.get(input_type)) is None:
+        # do not let arbitrary batch input_types create new time series
+        data_func, input_type = invalid_input_type, 'invalid'
+    with REQUEST_SECONDS.time(input_type):
+        status, scr = _resolve_scr(
+            data_func, user_input, date_format, pipe_format
+        )
+    REQUESTS.inc(input_type, status[:3])
+    return status, scr
+
+
+async def async_resolve_scr(
+    input_type: str,
+    data_func: Callable,
+    user_input: str,
+    date_format: str,
+    pipe_format: str,
+) -> tuple[str, tuple]:
+    """Like resolve_scr, for data_func in async_resolvers."""
+    with REQUEST_SECONDS.time(input_type):
+        try:
+            d = await async_cached_data(data_func, user_input)
+        except Exception as e:
+            status, scr = error_scr(e, user_input)
+        else:
+            status, scr = data_scr(d, date_format, pipe_format)
+    REQUESTS.inc(input_type, status[:3])
+    return status, scr
+
+
+def _resolve_scr(
+    data_func: Callable,
+    user_input: str | dict,
+    date_format: str,
+    pipe_format: str,
+) -> tuple[str, tuple]:
+    try:
+        d = cached_data(data_func, user_input)
+    except Exception as e:
+        return error_scr(e, user_input)
+    return data_scr(d, date_format, pipe_format)
+
+
+def error_scr(e: Exception, user_input: str | dict) -> tuple[str, tuple]:
+    """Return (status, scr) for an error raised by a resolver."""
+    if isinstance(e, ReturnError):
+        scr = e.args
+    else:
+        if not isinstance(e, CurlError):
+            logger.exception(user_input)
+        scr = type(e).__name__, '', ''
+    return '500 Internal Server Error', scr
+
+
+def data_scr(d: dict, date_format: str, pipe_format: str) -> tuple[str, tuple]:
+    """Return (status, scr) for the data of a resolver."""
+    try:
+        scr = data_to_sfn_cit_ref(d, date_format, pipe_format)
+    except Exception as e:
+        logger.exception('Error in data_to_sfn_cit_ref')
+        return '500 Internal Server Error', (type(e).__name__, '', '')
+    return '200 OK', scr
+
+
+def invalid_input_type(_):
+    raise ReturnError('Error: invalid input_type', '', '')
+
+
+def batch_item_scr(
+    item: tuple[str, str | dict],
+    date_format: str,
+    pipe_format: str,
+    deadline: Deadline,
+) -> tuple[str, tuple]:
+    input_type, user_input = item
+    # All items share the deadline of the batch request.
+    with deadline_scope(deadline):
+        return resolve_scr(input_type, user_input, date_format, pipe_format)
+
+
+def batch_scrs(
+    items: list[tuple[str, str | dict]], date_format: str, pipe_format: str
+) -> list[tuple]:
+    """Resolve batch items concurrently and return their scrs in order."""
+    item_scr = partial(
+        batch_item_scr,
+        date_format=date_format,
+        pipe_format=pipe_format,
+        deadline=Deadline(),
+    )
+    with ThreadPoolExecutor(
+        min(len(items), BATCH_MAX_WORKERS) or 1
+    ) as executor:
+        return [scr for _, scr in executor.map(item_scr, items)]
+
+
+def ndjson_line(index: int, status: str, scr: tuple) -> bytes:
+    return (dumps((index, int(status[:3]), *scr)) + '\n').encode()
+
+
+def ndjson_scrs(
+    items: list[tuple[str, str | dict]], date_format: str, pipe_format: str
+) -> Iterator[bytes]:
+    """Yield an `[index, status, sfn, cit, ref]` JSON line per item as it
+    finishes. status is the HTTP status code the item would have had as a
+    single request.
+    """
+    executor = ThreadPoolExecutor(min(len(items), BATCH_MAX_WORKERS) or 1)
+    deadline = Deadline()
+    try:
+        futures = {
+            executor.submit(
+                batch_item_scr, item, date_format, pipe_format, deadline
+            ): i
+            for i, item in enumerate(items)
+        }
+        for future in as_completed(futures):
+            yield ndjson_line(futures[future], *future.result())
+    finally:
+        # do not wait for the remaining items if the client has gone away
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def is_bot(environ: dict) -> bool:
+    """Return True for data processing requests that fail validation."""
+    # WSGI prefixes custom client HTTP headers with 'HTTP_' and converts them to uppercase
+    return (
+        environ.get('REQUEST_METHOD') == 'POST'
+        and environ.get('HTTP_X_GATEWAY_VALIDATION')
+        != 'CITER_IS_NOT_INTENDED_FOR_BOTS'
+    )
+
+
+def root(start_response: StartResponse, environ: dict) -> BytesIterable:
     # 1. Anti-bot validation for data processing requests
-    if environ.get('REQUEST_METHOD') == 'POST':
-        # WSGI prefixes custom client HTTP headers with 'HTTP_' and converts them to uppercase
-        if (
-            environ.get('HTTP_X_GATEWAY_VALIDATION')
-            != 'CITER_IS_NOT_INTENDED_FOR_BOTS'
-        ):
-            start_response('403 Forbidden', [('Content-Type', 'text/plain')])
-            return (b'Forbidden: Bot activity detected.',)
+    if is_bot(environ):
+        start_response('403 Forbidden', [('Content-Type', 'text/plain')])
+        return (b'Forbidden: Bot activity detected.',)
 
-    (
-        date_format,
-        pipe_format,
-        input_type,
-        user_input,
-        headers,
-        scr_to_resp_body,
-    ) = parse_params(environ)
+    try:
+        (
+            date_format,
+            pipe_format,
+            input_type,
+            user_input,
+            headers,
+            scr_to_resp_body,
+        ) = parse_params(environ)
+    except InvalidBatchError as e:
+        start_response('400 Bad Request', [*json_headers])
+        return (dumps((f'Error: {e}', '', '')).encode(),)
 
     # 2. Deflect GET queries. Force user_input to empty string so the server
     # only delivers the shell page, leaving query processing to client-side JS.
     if environ.get('REQUEST_METHOD') == 'GET':
         user_input = ''
 
-    if not user_input:
-        response_body = scr_to_html(
-            default_scr, date_format, pipe_format, input_type
-        ).encode()
-        start_response('200 OK', [*http_headers])
+    # An empty batch is still a batch; it gets an empty list, not the shell.
+    if not user_input and type(user_input) is not list:
+        status, headers, response_body = shell_response(
+            date_format,
+            pipe_format,
+            input_type,
+            environ.get('HTTP_ACCEPT_ENCODING', ''),
+            environ.get('HTTP_IF_NONE_MATCH', ''),
+        )
+        start_response(status, headers)
         return (response_body,)
 
-    data_func = input_type_to_resolver[input_type]
+    if 'application/x-ndjson' in environ.get('HTTP_ACCEPT', ''):
+        if input_type == 'batch':
+            start_response('200 OK', [*ndjson_headers])
+            return ndjson_scrs(user_input, date_format, pipe_format)  # type: ignore
+        # A single input has nothing to stream; wait for its real status.
+        status, scr = batch_item_scr(
+            (input_type, user_input),  # type: ignore
+            date_format,
+            pipe_format,
+            Deadline(),
+        )
+        start_response(status, [*ndjson_headers])
+        return (ndjson_line(0, status, scr),)
 
-    try:
-        d = data_func(user_input)
-    except Exception as e:
-        status = '500 Internal Server Error'
+    if input_type == 'batch':
+        response_body = dumps(
+            batch_scrs(user_input, date_format, pipe_format)  # type: ignore
+        ).encode()
+        start_response('200 OK', headers)
+        return (response_body,)
 
-        if isinstance(e, ReturnError):
-            scr = e.args
-        else:
-            if not isinstance(e, CurlError):
-                logger.exception(user_input)
-            scr = type(e).__name__, '', ''
-    else:
-        try:
-            scr = data_to_sfn_cit_ref(d, date_format, pipe_format)
-        except Exception as e:
-            logger.exception('Error in data_to_sfn_cit_ref')
-            scr = (type(e).__name__, '', '')
-            status = '500 Internal Server Error'
-        else:
-            status = '200 OK'
+    with deadline_scope(Deadline()):
+        status, scr = resolve_scr(
+            input_type, user_input, date_format, pipe_format
+        )
 
     response_body = scr_to_resp_body(scr).encode()
     start_response(status, headers)
     return (response_body,)
 
 
+def metrics_response(start_response: StartResponse, _) -> BytesTuple:
+    start_response(
+        '200 OK',
+        [('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')],
+    )
+    return (render_metrics().encode(),)
+
+
 def lazy_version_info(start_response: StartResponse, environ: dict):
     from lib.version_info import version_info
 
     return version_info(start_response, environ)
 
 
-get_handler: Callable[[str], Callable[[StartResponse, dict], BytesTuple]] = {
+get_handler: Callable[
+    [str], Callable[[StartResponse, dict], BytesIterable]
+] = {
     f'/{CSS_PATH}.css': css_response,
     f'/{JS_PATH}.js': js_response,
     '/': root,
     '/citer.fcgi': root,  # for backward compatibility
     '/version': lazy_version_info,
+    '/metrics': metrics_response,
 }.get  # type: ignore
 
 
-def app(environ: dict, start_response: StartResponse) -> BytesTuple:
+def app(environ: dict, start_response: StartResponse) -> BytesIterable:
     # noinspection PyBroadException
     try:
         return (get_handler(environ['PATH_INFO']) or page_does_not_exist)(
@@ -297,6 +709,205 @@ def app(environ: dict, start_response: StartResponse) -> BytesTuple:
         return (b'Unknown Error',)
 
 
+async def async_root(environ: dict) -> tuple[str, list, bytes] | None:
+    """Resolve a single POSTed input of async_resolvers on the event loop.
+
+    Return None if `root` should handle the request instead.
+    """
+    if (
+        environ['REQUEST_METHOD'] != 'POST'
+        or is_bot(environ)
+        or 'application/x-ndjson' in environ.get('HTTP_ACCEPT', '')
+    ):
+        return None
+    try:
+        (
+            date_format,
+            pipe_format,
+            input_type,
+            user_input,
+            headers,
+            scr_to_resp_body,
+        ) = parse_params(environ)
+    except ValueError:  # let root respond to invalid input
+        user_input = None
+    if (
+        not user_input
+        or type(user_input) is not str
+        or (data_func := input_type_to_resolver.get(input_type))
+        not in async_resolvers
+    ):
+        environ['wsgi.input'].seek(0)
+        return None
+    with deadline_scope(Deadline()):
+        status, scr = await async_resolve_scr(
+            input_type, data_func, user_input, date_format, pipe_format
+        )
+    return status, headers, scr_to_resp_body(scr).encode()
+
+
+async def read_asgi_body(receive: Callable) -> bytes | None:
+    """Return the request body, or None if the client has disconnected."""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_RESPONSE_LENGTH:
+            logger.error(f'ASGI body was too long; {size:,}+ bytes')
+            return b''  # do not process the input
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+def asgi_environ(scope: dict, body: bytes) -> dict:
+    """Convert an ASGI HTTP scope to the WSGI environ expected by handlers."""
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_SOFTWARE': 'ASGI',
+    }
+    for name, value in scope['headers']:
+        key = name.decode('latin1').upper().replace('-', '_')
+        if key != 'CONTENT_TYPE':
+            key = 'HTTP_' + key
+        value = value.decode('latin1')
+        # like WSGI servers, join repeated headers with commas
+        if (previous := environ.get(key)) is not None:
+            value = f'{previous},{value}'
+        environ[key] = value
+    environ['CONTENT_LENGTH'] = str(len(body))
+    environ['wsgi.input'] = BytesIO(body)
+    return environ
+
+
+async def asgi_lifespan(receive: Callable, send: Callable) -> None:
+    prewarm_task = None
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # resolvers on asgi_executor use session_pool
+            start_prewarming()
+            prewarm_task = start_async_prewarming()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            stop_prewarming()
+            if prewarm_task is not None:
+                prewarm_task.cancel()
+            asgi_executor.shutdown(wait=False, cancel_futures=True)
+            await close_async_session()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def send_start(
+    send: Callable, status: str, headers: list[tuple[str, str]]
+) -> None:
+    await send(
+        {
+            'type': 'http.response.start',
+            'status': int(status[:3]),
+            'headers': [
+                (name.lower().encode('latin1'), value.encode('latin1'))
+                for name, value in headers
+            ],
+        }
+    )
+
+
+async def send_wsgi_response(send: Callable, environ: dict) -> None:
+    """Run `app` on asgi_executor and send its response."""
+    status_headers = []
+    # data passed to the write callable of start_response
+    written: list[bytes] = []
+
+    def start_response(status: str, headers: list[tuple[str, str]], *_):
+        status_headers[:] = status, headers
+        return written.append
+
+    loop = get_running_loop()
+    body = await loop.run_in_executor(
+        asgi_executor, app, environ, start_response
+    )
+    chunks = iter(body)
+    try:
+        await send_start(send, *status_headers)
+        # Body iterables may be lazy and block, so iterate them off the loop.
+        while True:
+            chunk = await loop.run_in_executor(
+                asgi_executor, next, chunks, None
+            )
+            for data in written:
+                await send(
+                    {
+                        'type': 'http.response.body',
+                        'body': data,
+                        'more_body': True,
+                    }
+                )
+            written.clear()
+            if chunk is None:
+                break
+            await send(
+                {
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                }
+            )
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if (close := getattr(body, 'close', None)) is not None:
+            await loop.run_in_executor(asgi_executor, close)
+
+
+async def asgi_app(scope: dict, receive: Callable, send: Callable) -> None:
+    """ASGI counterpart of `app`, e.g. `uvicorn app:asgi_app`.
+
+    Routing is shared with `app` through `get_handler`. Single inputs of
+    async_resolvers are resolved on the event loop with curl_cffi's
+    AsyncSession, so they do not hold a thread while waiting for upstreams.
+    Everything else runs `app` on asgi_executor.
+    """
+    if scope['type'] == 'lifespan':
+        return await asgi_lifespan(receive, send)
+
+    if (body := await read_asgi_body(receive)) is None:
+        return  # the client has gone away
+    environ = asgi_environ(scope, body)
+    if get_handler(environ['PATH_INFO']) is root:
+        try:
+            response = await async_root(environ)
+        except Exception:
+            logger.exception('app error, environ:\n%s', environ)
+            response = '500 Internal Server Error', [], b'Unknown Error'
+        if response is not None:
+            status, headers, response_body = response
+            await send_start(send, status, headers)
+            await send({'type': 'http.response.body', 'body': response_body})
+            return
+    await send_wsgi_response(send, environ)
+
+
+# Loading the language identification model takes seconds; do it when the
+# app is loaded (before forking, under uWSGI) instead of on the first request
+# that needs it.
+load_langid_model()
+
+try:
+    from uwsgidecorators import postfork
+except ImportError:  # not running under uWSGI
+    pass
+else:
+    # threads started in the uWSGI master would not survive the fork
+    postfork(start_prewarming)
+
+
 if __name__ == '__main__':
     # note that app.py is not run as '__main__' in kubernetes
     # only for local computer
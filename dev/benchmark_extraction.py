@@ -0,0 +1,95 @@
+"""Compare the speed and accuracy of the meta extraction engines.
+
+Run from the repository root:
+
+    python -m dev.benchmark_extraction [rounds]
+
+Each engine indexes every page in tests/testdata, then the url_data
+finders are run on its index; both throughputs are reported. Accuracy is
+the share of fields that equal those of the regex engine, whose results
+are what the tests expect.
+"""
+
+from html import unescape
+from pathlib import Path
+from sys import argv
+from time import perf_counter
+
+from lib.urls import (
+    find_date,
+    find_doi,
+    find_issn,
+    find_issue,
+    find_journal,
+    find_pages,
+    find_pmid,
+    find_publisher,
+    find_volume,
+    search_title,
+)
+from lib.urls_authors import find_meta_authors
+from lib.urls_meta import ENGINES, MetaIndex
+
+TESTDATA = Path(__file__).parent.parent / 'tests' / 'testdata'
+
+
+def fields(html: str, meta: MetaIndex) -> dict:
+    return {
+        'doi': find_doi(meta),
+        'issn': find_issn(meta),
+        'pmid': find_pmid(meta),
+        'volume': find_volume(meta),
+        'issue': find_issue(meta),
+        'page': find_pages(meta),
+        'journal': find_journal(meta),
+        'publisher': find_publisher(meta),
+        'website': meta.get('og:site_name'),
+        'title': search_title(html, meta),
+        'date': find_date(html, meta, {}, ''),
+        'authors': find_meta_authors(meta),
+    }
+
+
+def normalized(value):
+    # lxml unescapes attribute values, url_data unescapes them later
+    return unescape(value) if type(value) is str else value
+
+
+def main(rounds: int) -> None:
+    pages = [
+        p.read_bytes().decode('utf-8', 'replace')
+        for p in sorted(TESTDATA.glob('*.html'))
+    ]
+    print(f'{len(pages)} pages, {rounds} rounds')
+    expected = [fields(html, ENGINES['regex'](html)) for html in pages]
+    for name, engine in ENGINES.items():
+        start = perf_counter()
+        for _ in range(rounds):
+            for html in pages:
+                engine(html)
+        index_elapsed = perf_counter() - start
+        start = perf_counter()
+        for _ in range(rounds):
+            for html in pages:
+                fields(html, engine(html))
+        elapsed = perf_counter() - start
+        total = matches = 0
+        mismatches: dict[str, int] = {}
+        for html, expected_fields in zip(pages, expected):
+            for field, value in fields(html, engine(html)).items():
+                total += 1
+                if normalized(value) == normalized(expected_fields[field]):
+                    matches += 1
+                else:
+                    mismatches[field] = mismatches.get(field, 0) + 1
+        print(
+            f'{name:>6}: {rounds * len(pages) / index_elapsed:8.1f} pages/s '
+            f'indexed, {rounds * len(pages) / elapsed:6.1f} pages/s with '
+            'finders, '
+            f'{matches / total:7.2%} fields match regex',
+            mismatches or '',
+        )
+
+
+if __name__ == '__main__':
+    main(int(argv[1]) if len(argv) > 1 else 5)
@@ -0,0 +1,37 @@
+"""Precompute the home page analysis of commonly cited sites.
+
+Run from the repository root:
+
+    python -m dev.build_home_seeds hosts.txt home_seeds.json
+
+hosts.txt has one home page URL, e.g. https://www.bbc.com, or hostname per
+line; hostnames are assumed to be served over https. Point the
+HOME_SEED_PATH setting to the output file to skip fetching these home pages.
+Sites whose home page cannot be fetched are left out.
+"""
+
+from json import dump
+from sys import argv
+
+from lib.urls import HomeList, _analyze_home
+
+
+def main(hosts_path: str, seeds_path: str) -> None:
+    seeds: dict[str, HomeList] = {}
+    with open(hosts_path, encoding='utf8') as f:
+        for line in f:
+            if not (home_url := line.strip().rstrip('/')):
+                continue
+            if '://' not in home_url:
+                home_url = 'https://' + home_url
+            home_list: HomeList = [None, None]
+            _analyze_home(home_url, home_list)
+            if home_list != [None, None]:
+                seeds[home_url] = home_list
+            print(home_url, home_list)
+    with open(seeds_path, 'w', encoding='utf8') as f:
+        dump(seeds, f, ensure_ascii=False, indent=0, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main(*argv[1:3])
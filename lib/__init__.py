@@ -1,5 +1,14 @@
-from collections.abc import Callable
-from contextlib import AbstractContextManager, contextmanager
+import threading
+from asyncio import AbstractEventLoop, get_running_loop, sleep as async_sleep
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import (
+    AbstractContextManager,
+    AsyncExitStack,
+    ExitStack,
+    asynccontextmanager,
+    contextmanager,
+)
+from contextvars import copy_context
 from functools import partial
 from logging import INFO, Formatter, basicConfig, getLogger
 from logging.handlers import RotatingFileHandler
@@ -7,12 +16,34 @@ from os.path import abspath, dirname
 from random import choice, choices, seed
 from ssl import CERT_NONE, create_default_context
 from string import ascii_lowercase, digits
+from time import monotonic, sleep
 from typing import Literal, overload
+from urllib.parse import urlparse
+from weakref import WeakKeyDictionary
 
-from curl_cffi.requests import Response, Session
+from curl_cffi import CurlError
+from curl_cffi.requests import AsyncSession, Response, Session
+from curl_cffi.requests.exceptions import HTTPError, Timeout
 from regex import compile as rc
 
 from config import USER_AGENT
+from lib.blocking import run_store_io
+from lib.cookies import BoundedCookieJar
+from lib.deadline import DeadlineExceeded, remaining_time, skip_enrichment
+from lib.httpcache import async_cached_get, cached_get, store as http_cache
+from lib.metrics import (
+    KNOWN_UPSTREAMS,
+    UPSTREAM_BYTES,
+    UPSTREAM_ERRORS,
+    UPSTREAM_SECONDS,
+    GaugeFunction,
+    caches,
+    flights,
+    upstream_label,
+)
+from lib.sessions import SessionPool
+from lib.singleflight import SingleFlight
+from lib.upstreams import LatencyTracker, circuit_breakers, rate_limiters
 
 
 def get_logger():
@@ -50,24 +81,172 @@ context.check_hostname = False
 context.verify_mode = CERT_NONE
 
 
-def new_session() -> Session:
-    return Session(verify=context, timeout=15.0, impersonate='chrome')  # type: ignore
+DEFAULT_TIMEOUT = 15.0  # seconds
+# Optional enrichments are skipped if less than this many seconds remain.
+ENRICHMENT_MIN_TIME = 10.0
+# Do not start a sub-request that would have less time than this.
+MIN_TIMEOUT = 0.5
+
+
+class RateLimitExceeded(CurlError):
+    """Raise when a rate limit would delay a request for too long."""
+
+
+class CircuitOpenError(CurlError):
+    """Raise instead of contacting an upstream that is considered down."""
+
+
+def time_is_short(enrichment: str) -> bool:
+    """Return True if the optional enrichment should be skipped.
+
+    Skipped enrichments are recorded for `skipped_enrichments`.
+    """
+    if remaining_time() >= ENRICHMENT_MIN_TIME:
+        return False
+    skip_enrichment(enrichment)
+    return True
+
+
+def budgeted_timeout(url: str, timeout: float) -> float:
+    """Shrink timeout to the time left before the current deadline."""
+    if (remaining := remaining_time()) >= timeout:
+        return timeout
+    if remaining < MIN_TIMEOUT:
+        raise DeadlineExceeded(f'no time left for requesting {url}')
+    return remaining
+
+
+def cut_short(url: str, timeout: float) -> bool:
+    """Return True if timeout is shorter than the learned timeout of url.
+
+    Such timeouts are set by the deadline or by the caller, so a Timeout
+    error of a request that used them says little about the upstream.
+    """
+    return timeout < latencies.timeout(urlparse(url).hostname)
+
+
+# Timeouts are learned per host, within these bounds.
+MIN_LEARNED_TIMEOUT = 5.0
+MAX_LEARNED_TIMEOUT = 30.0
+latencies = LatencyTracker(
+    DEFAULT_TIMEOUT, MIN_LEARNED_TIMEOUT, MAX_LEARNED_TIMEOUT
+)
+
+# Longest time a request may be queued by a rate limiter.
+RATE_LIMIT_MAX_WAIT = 5.0
+
 
+def rate_limit_delay(url: str) -> float:
+    """Reserve a request to the host of url; return the seconds to wait."""
+    if (bucket := rate_limiters.get(host := urlparse(url).hostname)) is None:
+        return 0.0
+    max_wait = min(RATE_LIMIT_MAX_WAIT, remaining_time() - MIN_TIMEOUT)
+    if (wait := bucket.reserve(max_wait)) is None:
+        raise RateLimitExceeded(f'rate limit of {host} exceeded')
+    return wait
 
-session_usage = 0
-session = new_session()
 
+def throttle(url: str) -> None:
+    """Wait until the rate limit of the host of url allows a request."""
+    if wait := rate_limit_delay(url):
+        sleep(wait)
 
-def mortal_session() -> Session:
-    global session, session_usage
-    if session_usage > 1000:  # to save memory by discarding unneeded cookies
-        session_usage = 0
-        session = new_session()
-        return session
-    session_usage += 1
+
+class Thread(threading.Thread):
+    """A thread that runs target in a copy of its creator's context.
+
+    Unlike threading.Thread, this keeps the request deadline in effect.
+    """
+
+    def __init__(self, target: Callable, args: tuple = ()):
+        super().__init__(target=copy_context().run, args=(target, *args))
+
+
+COOKIE_MAX_PER_DOMAIN = 50
+COOKIE_MAX_DOMAINS = 200
+# All pooled sessions share one cookie jar.
+cookie_jar = BoundedCookieJar(COOKIE_MAX_PER_DOMAIN, COOKIE_MAX_DOMAINS)
+
+
+def new_session() -> Session:
+    # A single curl handle per session keeps its connections warm when the
+    # session is used by another thread later.
+    return Session(
+        verify=context,
+        timeout=DEFAULT_TIMEOUT,
+        impersonate='chrome',
+        cookies=cookie_jar,
+        use_thread_local_curl=False,
+    )  # type: ignore
+
+
+SESSION_POOL_MAX_IDLE = 32
+session_pool = SessionPool(new_session, SESSION_POOL_MAX_IDLE)
+GaugeFunction(
+    'citer_session_pool',
+    'Statistics of the HTTP session pool.',
+    ('stat',),
+    lambda: {(k,): v for k, v in session_pool.stats().items()},
+)
+GaugeFunction(
+    'citer_circuit_open',
+    'Whether the circuit breaker of an upstream host is open.',
+    ('host',),
+    lambda: {(h,): int(b.is_open) for h, b in circuit_breakers.items()},
+)
+GaugeFunction(
+    'citer_learned_timeout_seconds',
+    'Timeouts learned from the latency of known upstream hosts.',
+    ('host',),
+    lambda: {
+        (h,): t
+        for h, t in latencies.timeouts().items()
+        if h in KNOWN_UPSTREAMS
+    },
+)
+GaugeFunction(
+    'citer_cookie_jar',
+    'Number of cookies and cookie domains in the shared cookie jar.',
+    ('stat',),
+    lambda: {(k,): v for k, v in cookie_jar.stats().items()},
+)
+
+
+@contextmanager
+def pooled_session() -> Iterator[Session]:
+    """Check out a session from session_pool for the duration of a request."""
+    with session_pool.session() as session:
+        yield session
+
+
+# An AsyncSession runs up to this many transfers at once; more are queued.
+ASYNC_MAX_CLIENTS = 256
+# An AsyncSession is bound to the event loop that created it.
+async_sessions: WeakKeyDictionary[AbstractEventLoop, AsyncSession] = (
+    WeakKeyDictionary()
+)
+
+
+def async_session() -> AsyncSession:
+    """Return the AsyncSession of the running event loop."""
+    loop = get_running_loop()
+    if (session := async_sessions.get(loop)) is None:
+        session = async_sessions[loop] = AsyncSession(
+            loop=loop,
+            verify=context,
+            timeout=DEFAULT_TIMEOUT,
+            impersonate='chrome',
+            cookies=cookie_jar,
+            max_clients=ASYNC_MAX_CLIENTS,
+        )  # type: ignore
     return session
 
 
+async def close_async_session() -> None:
+    if (session := async_sessions.pop(get_running_loop(), None)) is not None:
+        await session.close()
+
+
 Method = Literal['GET'] | Literal['POST'] | Literal['HEAD']
 
 
@@ -92,12 +271,147 @@ def request(
 
 
 @contextmanager
-def enhanced_stream_ctx(ctx: AbstractContextManager[Response]):
-    with ctx as response:
-        response.raise_for_status()
+def record_upstream(url: str, short: bool = False):
+    """Record latency and errors of an outbound request to url.
+
+    short tells if the request ran with a timeout that was `cut_short`.
+    """
+    label = upstream_label(url)
+    start = monotonic()
+    try:
+        yield
+    except CurlError as e:
+        UPSTREAM_ERRORS.inc(label, type(e).__name__)
+        # Other errors happen before a response could arrive. The elapsed
+        # time of a timeout is a lower bound and helps slow hosts.
+        if isinstance(e, HTTPError) or (isinstance(e, Timeout) and not short):
+            latencies.observe(urlparse(url).hostname, monotonic() - start)
+        raise
+    else:
+        latencies.observe(urlparse(url).hostname, monotonic() - start)
+    finally:
+        UPSTREAM_SECONDS.observe(monotonic() - start, label)
+
+
+def is_upstream_failure(e: CurlError) -> bool:
+    """Return False for HTTP errors that a healthy upstream also returns."""
+    if isinstance(e, HTTPError):
+        status = e.response.status_code  # type: ignore
+        return status >= 500 or status == 429
+    return True
+
+
+@contextmanager
+def circuit(url: str, short: bool = False):
+    """Fail fast if the circuit breaker of the host of url is open.
+
+    Otherwise record the outcome of the request made in this context. A
+    response slower than the learned timeout of the host counts as a
+    failure. A Timeout of a request whose timeout was `cut_short`, or any
+    non-curl exception, is not recorded.
+    """
+    if (
+        breaker := circuit_breakers.get(host := urlparse(url).hostname)
+    ) is None:
+        yield
+        return
+    if not breaker.allow():
+        raise CircuitOpenError(f'circuit breaker of {host} is open')
+    start = monotonic()
+    try:
+        yield
+    except CurlError as e:
+        if short and isinstance(e, Timeout):
+            breaker.cancel()
+        else:
+            breaker.record(is_upstream_failure(e))
+        raise
+    except BaseException:
+        # e.g. CancelledError of the losing task of a race; nothing was
+        # heard from the upstream
+        breaker.cancel()
+        raise
+    breaker.record(monotonic() - start > latencies.timeout(host))
+
+
+@contextmanager
+def stream_ctx(
+    method: Method, url: str, headers: dict | None, timeout: float, **kwargs
+) -> Iterator[Response]:
+    throttle(url)
+    timeout = budgeted_timeout(url, timeout)
+    short = cut_short(url, timeout)
+    with ExitStack() as stack:
+        with record_upstream(url, short), circuit(url, short):
+            # The stream reads the body with its own copy of the curl
+            # handle, so the session can go back to the pool right away.
+            with pooled_session() as session:
+                response = stack.enter_context(
+                    session.stream(
+                        method, url, headers=headers, timeout=timeout, **kwargs
+                    )
+                )
+            response.raise_for_status()
         yield response
 
 
+def send(
+    method: Method, url: str, headers: dict | None, timeout: float, **kwargs
+) -> Response:
+    throttle(url)
+    timeout = budgeted_timeout(url, timeout)
+    short = cut_short(url, timeout)
+    with (
+        record_upstream(url, short),
+        circuit(url, short),
+        pooled_session() as session,
+    ):
+        r = session.request(
+            method, url, headers=headers, timeout=timeout, **kwargs
+        )
+        assert r is not None
+        r.raise_for_status()
+    UPSTREAM_BYTES.inc(upstream_label(url), amount=len(r.content))
+    return r
+
+
+async def async_send(
+    method: Method, url: str, headers: dict | None, timeout: float, **kwargs
+) -> Response:
+    if wait := await run_store_io(rate_limit_delay, url):
+        await async_sleep(wait)
+    timeout = budgeted_timeout(url, timeout)
+    short = cut_short(url, timeout)
+    with record_upstream(url, short), circuit(url, short):
+        r = await async_session().request(
+            method, url, headers=headers, timeout=timeout, **kwargs
+        )
+        r.raise_for_status()
+    UPSTREAM_BYTES.inc(upstream_label(url), amount=len(r.content))
+    return r
+
+
+# Concurrent identical GET requests share one response.
+get_flight = flights['get'] = SingleFlight()
+caches['http'] = http_cache
+
+
+def request_options(
+    url: str, spoof: bool, kwargs: dict
+) -> tuple[dict | None, float]:
+    """Pop headers and timeout from kwargs and apply the defaults."""
+    headers = None if spoof is True else AGENT_HEADER
+    if (kw_headers := kwargs.pop('headers', None)) is not None:
+        if headers is not None:
+            headers = headers | kw_headers
+        else:
+            headers = kw_headers
+    if (timeout := kwargs.pop('timeout', None)) is None:
+        timeout = latencies.timeout(urlparse(url).hostname)
+    cookie_jar.note_request(url)
+    return headers, timeout
+
+
 def request(
     url,
     *,
@@ -106,20 +420,62 @@ def request(
     stream=False,
     **kwargs,
 ) -> Response | AbstractContextManager[Response]:
-    headers = None if spoof is True else AGENT_HEADER
-    if (kw_headers := kwargs.pop('headers', None)) is not None:
-        if headers is not None:
-            headers |= kw_headers
-        else:
-            headers = kw_headers
+    headers, timeout = request_options(url, spoof, kwargs)
     if stream is True:
-        ctx = mortal_session().stream(method, url, headers=headers, **kwargs)
-        return enhanced_stream_ctx(ctx)
-
-    r = mortal_session().request(method, url, headers=headers, **kwargs)
-    assert r is not None
-    r.raise_for_status()
-    return r
+        return stream_ctx(method, url, headers, timeout, **kwargs)
+
+    if method == 'GET' and not kwargs:
+        key = url, headers and tuple(headers.items())
+        return get_flight.do(
+            key,
+            cached_get,
+            url,
+            headers,
+            partial(send, method, url, timeout=timeout),
+        )
+    return send(method, url, headers, timeout, **kwargs)
+
+
+async def async_request(
+    url, *, spoof=False, method: Method = 'GET', **kwargs
+) -> Response:
+    """Like `request`, without blocking the running event loop.
+
+    Responses are cached and identical in-flight GETs of the same event
+    loop are coalesced like those of `request`.
+    """
+    headers, timeout = request_options(url, spoof, kwargs)
+    if method == 'GET' and not kwargs:
+        key = url, headers and tuple(headers.items())
+        return await get_flight.async_do(
+            key,
+            async_cached_get,
+            url,
+            headers,
+            partial(async_send, method, url, timeout=timeout),
+        )
+    return await async_send(method, url, headers, timeout, **kwargs)
+
+
+@asynccontextmanager
+async def async_stream(
+    url, *, spoof=False, method: Method = 'GET', **kwargs
+) -> AsyncIterator[Response]:
+    """Like `request` with stream=True, for the running event loop."""
+    headers, timeout = request_options(url, spoof, kwargs)
+    if wait := await run_store_io(rate_limit_delay, url):
+        await async_sleep(wait)
+    timeout = budgeted_timeout(url, timeout)
+    short = cut_short(url, timeout)
+    async with AsyncExitStack() as stack:
+        with record_upstream(url, short), circuit(url, short):
+            response = await stack.enter_async_context(
+                async_session().stream(
+                    method, url, headers=headers, timeout=timeout, **kwargs
+                )
+            )
+            response.raise_for_status()
+        yield response
 
 
 rc = partial(rc, cache_pattern=False)
@@ -279,6 +635,9 @@ def open_access_url(doi: str) -> str | None:
         if m[1] in known_free_doi_registrants:
             return ''
 
+    if time_is_short('open access url'):
+        return None
+
     try:
         oa = request(f'https://api.openaccessbutton.org/find?id={doi}').json()
     except Exception:
@@ -1,11 +1,10 @@
 from datetime import date
-from threading import Thread
 from urllib.parse import unquote, urlparse
 
 from curl_cffi import CurlError
 from regex import Match
 
-from lib import logger
+from lib import Thread, logger
 from lib.commons import rc
 from lib.urls import (
     ContentLengthError,
@@ -0,0 +1,31 @@
+"""Run blocking calls of the ASGI app off its event loop."""
+
+from asyncio import get_running_loop
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+from lib.cache import CACHE_PATH
+
+# Parsing pages and resolvers without an async version run on these threads.
+ASGI_MAX_THREADS = 200
+asgi_executor = ThreadPoolExecutor(ASGI_MAX_THREADS, 'asgi')
+
+
+async def run_blocking(func: Callable, /, *args):
+    """Run func on asgi_executor, keeping the request deadline."""
+    return await get_running_loop().run_in_executor(
+        asgi_executor, copy_context().run, func, *args
+    )
+
+
+async def run_store_io(func: Callable, /, *args):
+    """Call func, which may use the SQLite file of CACHE_PATH.
+
+    SQLite may block for up to its busy timeout, so func runs on
+    asgi_executor when CACHE_PATH is set. Without it, caches and rate
+    limiters are in memory and func is called directly.
+    """
+    if CACHE_PATH:
+        return await run_blocking(func, *args)
+    return func(*args)
@@ -0,0 +1,191 @@
+"""Caches for resolved data."""
+
+from collections import OrderedDict
+from os import getpid
+from pickle import dumps, loads
+from sqlite3 import Connection, Error as SQLiteError, connect
+from threading import Lock, local
+from time import time
+from typing import Any
+
+from config import CACHE_MAX_BYTES, CACHE_PATH
+
+
+def thread_connection(path: str, lcl: local) -> Connection:
+    """Return the SQLite connection to path of the current thread.
+
+    Connections are per thread and must not be inherited by forked uWSGI
+    workers, so lcl is expected to be a threading.local of the caller.
+    """
+    if getattr(lcl, 'pid', None) != (pid := getpid()):
+        lcl.pid = pid
+        lcl.connection = connect(path, timeout=5, isolation_level=None)
+        lcl.connection.execute('PRAGMA journal_mode=WAL')
+        lcl.connection.execute('PRAGMA synchronous=NORMAL')
+    return lcl.connection
+
+
+class LRUCache:
+    """A thread-safe, size-bounded LRU cache with per-entry TTLs.
+
+    Values are stored pickled; each `get` returns a fresh copy that the caller
+    is free to mutate.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+        self._data: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Any:
+        """Return the value of key or None if it is missing or expired."""
+        with self._lock:
+            if (item := self._data.get(key)) is None:
+                self.misses += 1
+                return None
+            expires, value = item
+            if expires < time():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return loads(value)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        value = dumps(value)
+        with self._lock:
+            data = self._data
+            data[key] = time() + ttl, value
+            data.move_to_end(key)
+            while len(data) > self.maxsize:
+                data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteCache:
+    """A byte-capped cache stored in an SQLite database.
+
+    All worker processes share the same file, so entries survive worker
+    recycling and restarts. Caches with different namespaces can share a
+    file; the byte cap and the least-recently-used eviction apply to the
+    whole file.
+    """
+
+    # number of `set` calls between two checks of the total size
+    EVICTION_INTERVAL = 64
+    # `used` is only refreshed on hits if it is older than this (seconds)
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, path: str, max_bytes: int, namespace: str):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.prefix = namespace + ':'
+        self.hits = self.misses = 0
+        self._sets = 0
+        self._local = local()
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'key TEXT PRIMARY KEY, value BLOB, expires REAL, used REAL, '
+            'size INTEGER)'
+        )
+        self._connection().execute(
+            'CREATE INDEX IF NOT EXISTS cache_used ON cache (used)'
+        )
+
+    def _connection(self) -> Connection:
+        return thread_connection(self.path, self._local)
+
+    def __len__(self) -> int:
+        return (
+            self._connection()
+            .execute(
+                'SELECT count(*) FROM cache WHERE key LIKE ?',
+                (self.prefix + '%',),
+            )
+            .fetchone()[0]
+        )
+
+    def get(self, key: str) -> Any:
+        """Return the value of key or None if it is missing or expired."""
+        key = self.prefix + key
+        now = time()
+        try:
+            c = self._connection()
+            row = c.execute(
+                'SELECT value, expires, used FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or row[1] < now:
+                self.misses += 1
+                return None
+            if row[2] < now - self.TOUCH_INTERVAL:
+                c.execute(
+                    'UPDATE cache SET used = ? WHERE key = ?', (now, key)
+                )
+        except SQLiteError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        if ttl <= 0 or self.max_bytes <= 0:
+            return
+        value = dumps(value)
+        now = time()
+        try:
+            self._connection().execute(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)',
+                (self.prefix + key, value, now + ttl, now, len(value)),
+            )
+            self._sets += 1
+            if self._sets % self.EVICTION_INTERVAL == 0:
+                self.evict()
+        except SQLiteError:
+            return
+
+    def evict(self) -> None:
+        """Remove expired entries, then LRU ones, until under max_bytes."""
+        c = self._connection()
+        total = c.execute('SELECT total(size) FROM cache').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        c.execute('DELETE FROM cache WHERE expires < ?', (time(),))
+        excess = (
+            c.execute('SELECT total(size) FROM cache').fetchone()[0]
+            - self.max_bytes * 0.9  # leave some headroom
+        )
+        if excess <= 0:
+            return
+        keys = []
+        for key, size in c.execute(
+            'SELECT key, size FROM cache ORDER BY used'
+        ):
+            keys.append((key,))
+            if (excess := excess - size) <= 0:
+                break
+        c.executemany('DELETE FROM cache WHERE key = ?', keys)
+
+    def clear(self) -> None:
+        self._connection().execute(
+            'DELETE FROM cache WHERE key LIKE ?', (self.prefix + '%',)
+        )
+
+
+def new_cache(namespace: str, maxsize: int) -> LRUCache | SQLiteCache:
+    """Return a cache shared between workers if CACHE_PATH is configured.
+
+    Otherwise return an in-memory LRUCache holding at most maxsize entries.
+    """
+    if CACHE_PATH:
+        return SQLiteCache(CACHE_PATH, CACHE_MAX_BYTES, namespace)
+    return LRUCache(maxsize)
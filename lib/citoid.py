@@ -3,7 +3,7 @@ from urllib.parse import quote_plus
 
 from regex import compile as rc
 
-from lib import four_digit_num, request
+from lib import async_request, four_digit_num, request
 from lib.commons import find_any_date
 
 TRANSLATE = {
@@ -25,15 +25,25 @@ TRANSLATE = {
 rm_non_numeric = partial(rc(r'\D').sub, '')
 
 
-def citoid_data(query: str, quote=False, /) -> dict:
+def citoid_url(query: str, quote: bool) -> str:
     if quote:
         query = quote_plus(query)
     # https://www.mediawiki.org/wiki/Citoid/API
-    r = request(
+    return (
         'https://en.wikipedia.org/api/rest_v1/data/citation/mediawiki/' + query
     )
 
-    j0 = r.json()[0]
+
+def citoid_data(query: str, quote=False, /) -> dict:
+    return citoid_dict(request(citoid_url(query, quote)).json()[0])
+
+
+async def async_citoid_data(query: str, quote=False, /) -> dict:
+    r = await async_request(citoid_url(query, quote))
+    return citoid_dict(r.json()[0])
+
+
+def citoid_dict(j0: dict) -> dict:
     get = j0.get
 
     d = {}
@@ -0,0 +1,112 @@
+"""A cookie jar with bounded memory usage."""
+
+from collections import OrderedDict
+from http.cookiejar import Cookie, CookieJar
+from urllib.parse import urlparse
+
+
+class BoundedCookieJar(CookieJar):
+    """A CookieJar that caps the number of cookies it holds.
+
+    Each domain keeps at most max_per_domain cookies; the oldest ones are
+    dropped first. When more than max_domains domains have cookies, all
+    cookies of the least recently used domain are dropped.
+
+    If keep_one_off is False, cookies are only stored for domains that
+    have been requested at least twice (see `note_request`); most hosts
+    are fetched once for a single citation and never again.
+    """
+
+    # number of hostnames whose request counts are remembered
+    MAX_TRACKED_HOSTS = 1000
+
+    def __init__(
+        self, max_per_domain: int, max_domains: int, keep_one_off=True
+    ):
+        super().__init__()
+        self.max_per_domain = max_per_domain
+        self.max_domains = max_domains
+        self.keep_one_off = keep_one_off
+        # domain -> None, least recently set or requested first
+        self._domains: OrderedDict[str, None] = OrderedDict()
+        # hostname or parent domain -> number of requests
+        self._requests: OrderedDict[str, int] = OrderedDict()
+
+    def note_request(self, url: str) -> None:
+        """Count a request to the host of url and all its parent domains.
+
+        Their cookies, which are sent with the request, become the most
+        recently used ones.
+        """
+        if not (host := urlparse(url).hostname):
+            return
+        labels = host.split('.')
+        with self._cookies_lock:  # type: ignore
+            requests = self._requests
+            domains = self._domains
+            for i in range(max(len(labels) - 1, 1)):
+                domain = '.'.join(labels[i:])
+                requests[domain] = requests.get(domain, 0) + 1
+                requests.move_to_end(domain)
+                for d in (domain, '.' + domain):
+                    if d in domains:
+                        domains.move_to_end(d)
+            while len(requests) > self.MAX_TRACKED_HOSTS:
+                requests.popitem(last=False)
+
+    def set_cookie(self, cookie: Cookie) -> None:
+        domain = cookie.domain
+        with self._cookies_lock:  # type: ignore
+            if (
+                self.keep_one_off is False
+                and self._requests.get(domain.lstrip('.'), 0) < 2
+            ):
+                return
+            super().set_cookie(cookie)
+            domains = self._domains
+            domains[domain] = None
+            domains.move_to_end(domain)
+
+            # _cookies is {domain: {path: {name: cookie}}}
+            cookies = self._cookies  # type: ignore
+            paths = cookies[domain]
+            excess = sum(map(len, paths.values())) - self.max_per_domain
+            for path, names in [*paths.items()]:
+                if excess <= 0:
+                    break
+                for name in [*names][:excess]:
+                    del names[name]
+                    excess -= 1
+                if not names:
+                    del paths[path]
+
+            while len(domains) > self.max_domains:
+                cookies.pop(domains.popitem(last=False)[0], None)
+
+    def clear(self, domain=None, path=None, name=None) -> None:
+        # clear_expired_cookies and clear_session_cookies also end up here
+        with self._cookies_lock:  # type: ignore
+            super().clear(domain, path, name)
+            if domain is None:
+                self._domains.clear()
+                return
+            cookies = self._cookies  # type: ignore
+            if (paths := cookies.get(domain)) is not None:
+                for p in [p for p, names in paths.items() if not names]:
+                    del paths[p]
+                if paths:
+                    return
+                del cookies[domain]
+            self._domains.pop(domain, None)
+
+    def stats(self) -> dict[str, int]:
+        with self._cookies_lock:  # type: ignore
+            cookies = self._cookies  # type: ignore
+            return {
+                'domains': len(cookies),
+                'cookies': sum(
+                    len(names)
+                    for paths in cookies.values()
+                    for names in paths.values()
+                ),
+            }
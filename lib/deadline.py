@@ -0,0 +1,93 @@
+"""A per-request deadline shared by everything that runs for the request."""
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import monotonic
+
+from curl_cffi import CurlError
+
+# The whole request is bounded by uWSGI's harakiri (60s in uwsgi.ini).
+REQUEST_DEADLINE = 50.0
+
+
+class DeadlineExceeded(CurlError):
+    """Raise when the request deadline leaves no time for a sub-request.
+
+    Being a CurlError, it triggers the same fallbacks as a network failure.
+    """
+
+
+class Deadline:
+    __slots__ = ('expires',)
+
+    def __init__(self, seconds: float = REQUEST_DEADLINE):
+        self.expires = monotonic() + seconds
+
+    def remaining(self) -> float:
+        return self.expires - monotonic()
+
+
+current_deadline: ContextVar[Deadline | None] = ContextVar(
+    'current_deadline', default=None
+)
+
+
+@contextmanager
+def deadline_scope(deadline: Deadline) -> Iterator[Deadline]:
+    """Make deadline apply to every `request` made in this context."""
+    token = current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        current_deadline.reset(token)
+
+
+def remaining_time() -> float:
+    if (deadline := current_deadline.get()) is None:
+        return float('inf')
+    return deadline.remaining()
+
+
+def wait_timeout() -> float | None:
+    """Return the timeout for a blocking wait, None if there is no deadline."""
+    if (remaining := remaining_time()) == float('inf'):
+        return None
+    return remaining
+
+
+def check_deadline(url: str) -> None:
+    """Raise DeadlineExceeded if the deadline has passed.
+
+    curl has no total timeout for streamed responses, only a low-speed
+    limit, so readers of a streamed body call this for each chunk.
+    """
+    if remaining_time() <= 0:
+        raise DeadlineExceeded(f'deadline exceeded while reading {url}')
+
+
+# Names of the optional enrichments skipped for lack of time, collected by
+# `skipped_enrichments`. The list is shared with threads and tasks started
+# in the same context.
+_skipped: ContextVar[list[str] | None] = ContextVar('_skipped', default=None)
+
+
+@contextmanager
+def skipped_enrichments() -> Iterator[list[str]]:
+    """Collect the enrichments skipped in this context by `skip_enrichment`.
+
+    A result missing some of them should not be cached for long.
+    """
+    parent = _skipped.get()
+    token = _skipped.set(skipped := [])
+    try:
+        yield skipped
+    finally:
+        _skipped.reset(token)
+        if parent is not None:  # the outer result lacks them too
+            parent += skipped
+
+
+def skip_enrichment(name: str) -> None:
+    if (skipped := _skipped.get()) is not None:
+        skipped.append(name)
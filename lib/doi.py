@@ -6,38 +6,63 @@ from curl_cffi import CurlError
 from langid import classify
 
 from config import LANG
-from lib import request
-from lib.citoid import citoid_data
+from lib import async_request, request
+from lib.citoid import async_citoid_data, citoid_data
 from lib.commons import doi_search
 
 
-def doi_data(doi_or_url, pure=False, date_format='%Y-%m-%d', /) -> dict:
+def doi_of(doi_or_url: str, pure: bool) -> str:
     if pure:
-        doi = doi_or_url
-    else:
-        # unescape '&amp;', '&lt;', and '&gt;' in doi_or_url
-        # decode percent encodings
-        decoded_url = unquote_plus(unescape(doi_or_url))
-        doi = doi_search(decoded_url)[0]  # type: ignore
+        return doi_or_url
+    # unescape '&amp;', '&lt;', and '&gt;' in doi_or_url
+    # decode percent encodings
+    decoded_url = unquote_plus(unescape(doi_or_url))
+    return doi_search(decoded_url)[0]  # type: ignore
+
+
+def doi_data(doi_or_url, pure=False, date_format='%Y-%m-%d', /) -> dict:
+    doi = doi_of(doi_or_url, pure)
     try:
         d = citoid_data(doi, True)
     except CurlError:
         d = crossref_data(doi)
+    return add_date_format_and_language(d, date_format)
+
+
+async def async_doi_data(
+    doi_or_url, pure=False, date_format='%Y-%m-%d', /
+) -> dict:
+    doi = doi_of(doi_or_url, pure)
+    try:
+        d = await async_citoid_data(doi, True)
+    except CurlError:
+        d = await async_crossref_data(doi)
+    return add_date_format_and_language(d, date_format)
 
+
+def add_date_format_and_language(d: dict, date_format: str) -> dict:
     d['date_format'] = date_format
     if LANG == 'fa':
         d['language'] = classify(d['title'])[0]
     return d
 
 
+# See https://citation.crosscite.org/docs.html for documentation.
+CROSSREF_HEADERS = {'Accept': 'application/vnd.citationstyles.csl+json'}
+
+
 def crossref_data(doi) -> dict:
     """Return the parsed data of crossref.org for the given DOI."""
-    # See https://citation.crosscite.org/docs.html for documentation.
-    r = request(
-        f'https://doi.org/{doi}',
-        headers={'Accept': 'application/vnd.citationstyles.csl+json'},
-    )
-    j = r.json()
+    r = request(f'https://doi.org/{doi}', headers=CROSSREF_HEADERS)
+    return crossref_dict(r.json())
+
+
+async def async_crossref_data(doi) -> dict:
+    r = await async_request(f'https://doi.org/{doi}', headers=CROSSREF_HEADERS)
+    return crossref_dict(r.json())
+
+
+def crossref_dict(j: dict) -> dict:
     g = (d := {k.lower(): v for k, v in j.items()}).get
 
     d['cite_type'] = d['type']
@@ -1,11 +1,20 @@
+from gzip import compress as gzip_compress
+from hashlib import blake2b
 from html import escape
 from os import name as osname
 from os.path import dirname
 from string import Template
 from zlib import adler32
 
+from regex import findall
+
 from config import LANG, STATIC_PATH
 
+try:
+    from brotli import compress as brotli_compress
+except ImportError:  # brotli is optional
+    brotli_compress = None
+
 htmldir = dirname(__file__)
 
 css = open(f'{htmldir}/common.css', 'rb').read()
@@ -36,7 +45,7 @@ JS_PATH = STATIC_PATH + str(adler32(js))
 CSS_PATH = STATIC_PATH + str(adler32(css))
 # None-zero-padded day directive is os dependant ('%#d' or '%-d')
 # See http://stackoverflow.com/questions/904928/
-HTML_SUBST = Template(
+html_template = (
     open(f'{htmldir}/{LANG}.html', encoding='utf8')
     .read()
     .replace(
@@ -52,7 +61,8 @@ HTML_SUBST = Template(
         1,
     )
     .replace('{d}', '#d' if osname == 'nt' else '-d')
-).substitute
+)
+HTML_SUBST = Template(html_template).substitute
 
 
 def scr_to_html(
@@ -89,3 +99,103 @@ else:  # LANG == 'fa'
         'در دسترس نیستند و یا ورودی نامعتبر است.',
         '',
     )
+
+
+HTML_CONTENT_TYPE = ('Content-Type', 'text/html; charset=UTF-8')
+VARY = ('Vary', 'Accept-Encoding')
+
+
+def compressed_variants(body: bytes) -> dict[str, bytes]:
+    """Return {content_coding: body} for all supported codings."""
+    variants = {'identity': body, 'gzip': gzip_compress(body, 9, mtime=0)}
+    if brotli_compress is not None:
+        variants['br'] = brotli_compress(body)
+    return variants
+
+
+def precompute_shells() -> dict[tuple[str, str, str], dict]:
+    """Render the empty-input page for every selectable combination.
+
+    Return {(date_format, pipe_format, input_type): {coding: (etag, body)}}.
+    """
+    date_formats = {'%Y-%m-%d'}.union(
+        findall(r'name="dateformat" value="([^"]*)"', html_template)
+    )
+    pipe_formats = {' | '}.union(
+        findall(r'name="pipeformat" value="([^"]*)"', html_template)
+    )
+    input_types = {''}.union(
+        findall(r'<option value="([^"]*)"', html_template)
+    )
+    shells = {}
+    for date_format in date_formats:
+        for pipe_format in pipe_formats:
+            for input_type in input_types:
+                body = scr_to_html(
+                    default_scr, date_format, pipe_format, input_type
+                ).encode()
+                tag = blake2b(body, digest_size=12).hexdigest()
+                shells[date_format, pipe_format, input_type] = {
+                    coding: (f'"{tag}-{coding}"', variant)
+                    for coding, variant in compressed_variants(body).items()
+                }
+    return shells
+
+
+shells = precompute_shells()
+
+
+def accepted_codings(accept_encoding: str) -> set[str]:
+    codings = set()
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        q = params.strip()
+        try:
+            if q[:2] == 'q=' and float(q[2:]) == 0:
+                continue
+        except ValueError:
+            continue
+        codings.add(coding.strip().lower())
+    return codings
+
+
+def shell_response(
+    date_format: str,
+    pipe_format: str,
+    input_type: str,
+    accept_encoding: str,
+    if_none_match: str,
+) -> tuple[str, list[tuple[str, str]], bytes]:
+    """Return (status, headers, body) of the empty-input page."""
+    if (
+        variants := shells.get((date_format, pipe_format, input_type))
+    ) is None:
+        # a hand-crafted query; not worth caching
+        body = scr_to_html(
+            default_scr, date_format, pipe_format, input_type
+        ).encode()
+        return '200 OK', [HTML_CONTENT_TYPE, ALLOW_ALL_ORIGINS], body
+
+    codings = accepted_codings(accept_encoding)
+    for coding in ('br', 'gzip'):
+        if coding in codings and coding in variants:
+            break
+    else:
+        coding = 'identity'
+    etag, body = variants[coding]
+
+    if if_none_match:
+        tags = {t.strip().removeprefix('W/') for t in if_none_match.split(',')}
+        if '*' in tags or etag in tags:
+            return '304 Not Modified', [('ETag', etag), VARY], b''
+
+    headers = [
+        HTML_CONTENT_TYPE,
+        ALLOW_ALL_ORIGINS,
+        ('Content-Length', str(len(body))),
+        ('ETag', etag),
+        VARY,
+    ]
+    if coding != 'identity':
+        headers.append(('Content-Encoding', coding))
+    return '200 OK', headers, body
@@ -0,0 +1,211 @@
+"""An HTTP cache for lib.request, following RFC 9111 for shared caches.
+
+Only successful GET responses are stored. Fresh responses are served
+without contacting the upstream; stale ones that carry an ETag or a
+Last-Modified validator are revalidated with a conditional request.
+"""
+
+from collections.abc import Awaitable, Callable
+from email.utils import parsedate_to_datetime
+from time import time
+from urllib.parse import urlparse
+
+from curl_cffi.requests.headers import Headers
+from curl_cffi.requests.models import Response
+
+from config import HTTP_CACHE_SIZE
+from lib.blocking import run_store_io
+from lib.cache import new_cache
+
+DAY = 86400
+# Freshness lifetime of responses from hosts that send no caching headers.
+HOST_TTLS = {
+    'doi.org': 7 * DAY,
+    'en.wikipedia.org': DAY,  # citoid
+    'eutils.ncbi.nlm.nih.gov': 7 * DAY,
+    'msapi.ketab.ir': 7 * DAY,
+    'search.worldcat.org': 7 * DAY,
+    'www.googleapis.com': DAY,
+}
+# How long stale responses with validators are kept for revalidation.
+STALE_RETENTION = 7 * DAY
+# Larger responses are not stored.
+MAX_ENTRY_BYTES = 1_000_000
+
+store = new_cache('http', HTTP_CACHE_SIZE)
+
+
+def cache_control(headers: Headers) -> dict[str, str]:
+    directives = {}
+    for value in headers.get_list('cache-control'):
+        for directive in value.split(','):
+            name, _, arg = directive.partition('=')
+            if name := name.strip().lower():
+                directives[name] = arg.strip().strip('"')
+    return directives
+
+
+def http_date(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def seconds(value: str | None) -> float | None:
+    try:
+        return max(int(value), 0)  # type: ignore
+    except (TypeError, ValueError):
+        return None
+
+
+def freshness_lifetime(
+    url: str, headers: Headers, directives: dict[str, str]
+) -> float:
+    """Return the freshness lifetime of a response in seconds.
+
+    See RFC 9111 section 4.2.1. Hosts in HOST_TTLS take the place of
+    heuristic freshness.
+    """
+    if 'no-cache' in directives:
+        return 0
+    for directive in ('s-maxage', 'max-age'):
+        if (lifetime := seconds(directives.get(directive))) is not None:
+            return lifetime
+    if (expires := headers.get('expires')) is not None:
+        if (expires := http_date(expires)) is None:
+            return 0  # an invalid Expires means already expired
+        date = http_date(headers.get('date')) or time()
+        return max(expires - date, 0)
+    return HOST_TTLS.get(urlparse(url).hostname, 0)  # type: ignore
+
+
+def cache_key(url: str, headers: dict | None) -> str:
+    # All request headers are part of the key, so Vary is always satisfied.
+    return f'{url} {sorted(headers.items()) if headers else ""}'
+
+
+def entry_response(entry: dict) -> Response:
+    r = Response()
+    r.url = entry['url']
+    r.status_code = entry['status_code']
+    r.reason = entry['reason']
+    r.headers = Headers(entry['headers'])
+    r.content = entry['content']
+    return r
+
+
+def store_response(
+    key: str, url: str, r: Response, response_time: float
+) -> None:
+    headers = r.headers
+    directives = cache_control(headers)
+    if (
+        r.status_code != 200
+        or 'no-store' in directives
+        or 'private' in directives
+        or headers.get('vary') == '*'
+        or len(r.content) > MAX_ENTRY_BYTES
+    ):
+        return
+    # HOST_TTLS apply to the requested url, not to where it redirects
+    lifetime = freshness_lifetime(url, headers, directives)
+    # RFC 9111 section 4.2.3, assuming no delay between request and response
+    age = seconds(headers.get('age')) or 0
+    if (date := http_date(headers.get('date'))) is not None:
+        age = max(age, response_time - date)
+    ttl = lifetime - age
+    if 'etag' in headers or 'last-modified' in headers:
+        ttl += STALE_RETENTION
+    if ttl <= 0:
+        return
+    store.set(
+        key,
+        {
+            'url': r.url,
+            'status_code': r.status_code,
+            'reason': r.reason,
+            'headers': [
+                (k, v)
+                for k, v in headers.multi_items()
+                if k.lower() != 'set-cookie'
+            ],
+            'content': r.content,
+            'fresh_until': response_time + lifetime - age,
+        },
+        ttl,
+    )
+
+
+def conditional_headers(entry: dict) -> dict[str, str]:
+    headers = Headers(entry['headers'])
+    conditions = {}
+    if (etag := headers.get('etag')) is not None:
+        conditions['If-None-Match'] = etag
+    if (last_modified := headers.get('last-modified')) is not None:
+        conditions['If-Modified-Since'] = last_modified
+    return conditions
+
+
+def revalidated_response(entry: dict, r: Response) -> Response:
+    """Return the stored response if r is 304 Not Modified, otherwise r."""
+    if r.status_code != 304:
+        return r
+    # RFC 9111 section 4.3.4: update the stored headers
+    stored = Headers(entry['headers'])
+    for k, v in r.headers.multi_items():
+        if k.lower() not in {'content-length', 'set-cookie'}:
+            stored[k] = v
+    entry['headers'] = [*stored.multi_items()]
+    return entry_response(entry)
+
+
+def cached_get(
+    url: str,
+    headers: dict | None,
+    fetch: Callable[[dict | None], Response],
+) -> Response:
+    """Return the response for url, calling fetch(headers) only if needed."""
+    if HTTP_CACHE_SIZE <= 0:
+        return fetch(headers)
+    key = cache_key(url, headers)
+    if (entry := store.get(key)) is not None:
+        if entry['fresh_until'] > time():
+            return entry_response(entry)
+        conditions = conditional_headers(entry)
+        r = fetch(headers | conditions if headers else conditions)
+        response_time = time()
+        r = revalidated_response(entry, r)
+    else:
+        r = fetch(headers)
+        response_time = time()
+    store_response(key, url, r, response_time)
+    return r
+
+
+async def async_cached_get(
+    url: str,
+    headers: dict | None,
+    fetch: Callable[[dict | None], Awaitable[Response]],
+) -> Response:
+    """Like cached_get, for an async fetch.
+
+    The store is used off the event loop if it is an SQLite file.
+    """
+    if HTTP_CACHE_SIZE <= 0:
+        return await fetch(headers)
+    key = cache_key(url, headers)
+    if (entry := await run_store_io(store.get, key)) is not None:
+        if entry['fresh_until'] > time():
+            return entry_response(entry)
+        conditions = conditional_headers(entry)
+        r = await fetch(headers | conditions if headers else conditions)
+        response_time = time()
+        r = revalidated_response(entry, r)
+    else:
+        r = await fetch(headers)
+        response_time = time()
+    await run_store_io(store_response, key, url, r, response_time)
+    return r
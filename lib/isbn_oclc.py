@@ -1,5 +1,4 @@
 from json import loads
-from threading import Thread
 
 from curl_cffi import CurlError
 from isbnlib import info as isbn_info, mask as isbn_mask
@@ -7,7 +6,7 @@ from langid import classify
 from regex import search
 
 from config import LANG
-from lib import four_digit_num, logger, request
+from lib import Thread, four_digit_num, logger, request
 from lib.citoid import citoid_data
 from lib.commons import (
     ReturnError,
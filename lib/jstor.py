@@ -1,7 +1,6 @@
-from threading import Thread
 from urllib.parse import urlparse
 
-from lib import request
+from lib import Thread, request
 from lib.bibtex import parse as bibtex_parse
 
 
@@ -0,0 +1,241 @@
+"""Prometheus-style metrics, exposed by the /metrics route.
+
+Metrics are kept per worker process. Every sample has a `worker` label with
+the pid of its process, so that samples scraped from different uWSGI workers
+do not overwrite each other and can be summed with `sum without (worker)`.
+"""
+
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections.abc import Callable
+from contextlib import contextmanager
+from os import getpid
+from threading import Lock
+from time import perf_counter
+from urllib.parse import urlparse
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30, 60)
+
+registry: list['Metric'] = []
+
+
+def escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def format_labels(names: tuple[str, ...], values: tuple, extra='') -> str:
+    pairs = [f'worker="{getpid()}"']
+    pairs += [f'{n}="{escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}'
+
+
+class Metric(ABC):
+    type = ''
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = Lock()
+        registry.append(self)
+
+    @abstractmethod
+    def samples(self) -> list[str]: ...
+
+    def render(self) -> str:
+        return (
+            f'# HELP {self.name} {self.help}\n'
+            f'# TYPE {self.name} {self.type}\n'
+            + ''.join(f'{s}\n' for s in self.samples())
+        )
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...]):
+        super().__init__(name, help, labelnames)
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *labelvalues, amount: float = 1) -> None:
+        with self._lock:
+            self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = [*self.values.items()]
+        return [
+            f'{self.name}{format_labels(self.labelnames, lv)} {v}'
+            for lv, v in items
+        ]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...],
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = buckets
+        # labelvalues -> [per-bucket counts..., +Inf count, sum]
+        self.values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, *labelvalues) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            if (counts := self.values.get(labelvalues)) is None:
+                counts = self.values[labelvalues] = [0] * (
+                    len(self.buckets) + 2
+                )
+            counts[i] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, *labelvalues):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, *labelvalues)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = [(lv, [*counts]) for lv, counts in self.values.items()]
+        name = self.name
+        names = self.labelnames
+        samples = []
+        for lv, counts in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                le = format_labels(names, lv, f'le="{bound}"')
+                samples.append(f'{name}_bucket{le} {cumulative}')
+            labels = format_labels(names, lv)
+            samples.append(f'{name}_count{labels} {cumulative}')
+            samples.append(f'{name}_sum{labels} {counts[-1]}')
+        return samples
+
+
+class GaugeFunction(Metric):
+    """A gauge whose samples are computed by func at scrape time.
+
+    func should return a dict mapping label-value tuples to values.
+    """
+
+    type = 'gauge'
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...],
+        func: Callable[[], dict[tuple, float]],
+    ):
+        super().__init__(name, help, labelnames)
+        self.func = func
+
+    def samples(self) -> list[str]:
+        return [
+            f'{self.name}{format_labels(self.labelnames, lv)} {v}'
+            for lv, v in self.func().items()
+        ]
+
+
+def render() -> str:
+    return ''.join(m.render() for m in registry)
+
+
+# Hosts that get their own label value. Any other host is reported as
+# 'other' to keep the number of time series bounded.
+KNOWN_UPSTREAMS = {
+    'api.crossref.org',
+    'api.openaccessbutton.org',
+    'archive.ph',
+    'books.google.com',
+    'doi.org',
+    'en.wikipedia.org',
+    'eutils.ncbi.nlm.nih.gov',
+    'msapi.ketab.ir',
+    'search.worldcat.org',
+    'web.archive.org',
+    'www.googleapis.com',
+    'www.jstor.org',
+    'www.noorlib.ir',
+    'www.noormags.ir',
+}
+
+
+def upstream_label(url: str) -> str:
+    if (host := urlparse(url).hostname) in KNOWN_UPSTREAMS:
+        return host  # type: ignore
+    return 'other'
+
+
+UPSTREAM_SECONDS = Histogram(
+    'citer_upstream_request_duration_seconds',
+    'Latency of outbound requests until the response headers arrive.',
+    ('host',),
+)
+UPSTREAM_BYTES = Counter(
+    'citer_upstream_response_bytes_total',
+    'Bytes received from upstream hosts.',
+    ('host',),
+)
+UPSTREAM_ERRORS = Counter(
+    'citer_upstream_errors_total',
+    'Failed outbound requests.',
+    ('host', 'error'),
+)
+
+# name -> object with `hits` and `misses` attributes
+caches: dict[str, object] = {}
+
+
+def cache_ratios() -> dict[tuple, float]:
+    ratios = {}
+    for name, cache in caches.items():
+        hits, misses = cache.hits, cache.misses  # type: ignore
+        if total := hits + misses:
+            ratios[(name,)] = hits / total
+    return ratios
+
+
+def cache_counts(attr: str) -> Callable[[], dict[tuple, float]]:
+    return lambda: {(n,): getattr(c, attr) for n, c in caches.items()}
+
+
+GaugeFunction(
+    'citer_cache_hit_ratio',
+    'Ratio of cache lookups that were hits.',
+    ('cache',),
+    cache_ratios,
+)
+GaugeFunction(
+    'citer_cache_hits',
+    'Cache lookups that were hits.',
+    ('cache',),
+    cache_counts('hits'),
+)
+GaugeFunction(
+    'citer_cache_misses',
+    'Cache lookups that were misses.',
+    ('cache',),
+    cache_counts('misses'),
+)
+
+# name -> SingleFlight
+flights: dict[str, object] = {}
+
+GaugeFunction(
+    'citer_coalesced_calls',
+    'Calls that waited on an identical in-flight call instead of running.',
+    ('flight',),
+    lambda: {(n,): f.coalesced for n, f in flights.items()},  # type: ignore
+)
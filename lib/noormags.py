@@ -1,6 +1,4 @@
-from threading import Thread
-
-from lib import request
+from lib import Thread, request
 from lib.bibtex import parse as bibtex_parse
 from lib.commons import ReturnError, rc
 from lib.ris import ris_parse
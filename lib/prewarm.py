@@ -0,0 +1,104 @@
+"""Keep connections to frequently used upstreams open.
+
+Each pooled session owns its connections, so a number of sessions are
+checked out together and each one sends a HEAD request to every URL in
+PREWARM_URLS. Being the most recently returned sessions, they are the
+first to be reused by user requests.
+The ASGI app has a single AsyncSession per event loop instead, which is
+warmed up by as many concurrent requests to each URL.
+"""
+
+from asyncio import Task, create_task, gather, sleep
+from contextlib import ExitStack
+from threading import Event, Thread
+
+from curl_cffi import CurlError
+
+from config import PREWARM_URLS
+from lib import AGENT_HEADER, async_session, logger, session_pool
+
+# number of sessions to warm up
+PREWARM_SESSIONS = 4
+# Seconds between keep-alive rounds; shorter than the idle timeout of most
+# servers.
+KEEPALIVE_INTERVAL = 50.0
+PREWARM_TIMEOUT = 5.0
+
+stop_event = Event()
+
+
+def warm_up(urls) -> None:
+    with ExitStack() as stack:
+        sessions = [
+            stack.enter_context(session_pool.session())
+            for _ in range(PREWARM_SESSIONS)
+        ]
+        for session in sessions:
+            for url in urls:
+                try:
+                    session.request(
+                        'HEAD',
+                        url,
+                        headers=AGENT_HEADER,
+                        timeout=PREWARM_TIMEOUT,
+                    )
+                except CurlError as e:
+                    logger.info('could not prewarm %s: %r', url, e)
+
+
+def keep_warm(urls) -> None:
+    while True:
+        warm_up(urls)
+        if stop_event.wait(KEEPALIVE_INTERVAL):
+            return
+
+
+def start_prewarming() -> None:
+    """Warm up connections in the background, then keep them alive.
+
+    Call once in each worker process, after it has been forked.
+    """
+    if not PREWARM_URLS:
+        return
+    stop_event.clear()
+    Thread(
+        target=keep_warm, args=(PREWARM_URLS,), name='prewarm', daemon=True
+    ).start()
+
+
+def stop_prewarming() -> None:
+    stop_event.set()
+
+
+async def async_warm_up(urls) -> None:
+    session = async_session()
+    for url in urls:
+        for result in await gather(
+            *[
+                session.request(
+                    'HEAD', url, headers=AGENT_HEADER, timeout=PREWARM_TIMEOUT
+                )
+                for _ in range(PREWARM_SESSIONS)
+            ],
+            return_exceptions=True,
+        ):
+            if isinstance(result, CurlError):
+                logger.info('could not prewarm %s: %r', url, result)
+            elif isinstance(result, BaseException):
+                raise result
+
+
+async def async_keep_warm(urls) -> None:
+    while True:
+        await async_warm_up(urls)
+        await sleep(KEEPALIVE_INTERVAL)
+
+
+def start_async_prewarming() -> Task | None:
+    """Like start_prewarming, for the AsyncSession of the running loop.
+
+    Cancel the returned task to stop.
+    """
+    if not PREWARM_URLS:
+        return None
+    return create_task(async_keep_warm(PREWARM_URLS), name='prewarm')
@@ -1,13 +1,12 @@
 """Codes specifically related to PubMed inputs."""
 
 from datetime import datetime
-from threading import Thread
 
 from config import NCBI_API_KEY, NCBI_EMAIL, NCBI_TOOL
-from lib import logger, request
-from lib.citoid import citoid_data
+from lib import async_request, logger, request
+from lib.citoid import async_citoid_data, citoid_data
 from lib.commons import b_TO_NUM, rc
-from lib.doi import crossref_data
+from lib.doi import async_crossref_data, crossref_data
 
 NON_DIGITS_SUB = rc(r'[^\d]').sub
 
@@ -42,17 +41,49 @@ def pmcid_data(pmcid: str) -> dict:
     return dictionary
 
 
+async def async_pmid_data(pmid: str) -> dict:
+    return await async_ncbi('pmid', NON_DIGITS_SUB('', pmid))
+
+
+async def async_pmcid_data(pmcid: str) -> dict:
+    return await async_ncbi('pmcid', NON_DIGITS_SUB('', pmcid))
+
+
+def citoid_query(type_: str, id_: str) -> str:
+    return f'PMC{id_}' if type_ == 'pmcid' else id_
+
+
+def ncbi_url(type_: str, id_: str) -> str:
+    # According to https://www.ncbi.nlm.nih.gov/pmc/tools/get-metadata/
+    if type_ == 'pmid':
+        return PUBMED_URL + id_
+    return PMC_URL + id_  # type_ == 'pmcid'
+
+
 def ncbi(type_: str, id_: str) -> dict:
     """Return the NCBI data for the given id_. PMC"""
     try:
-        return citoid_data(f'PMC{id_}' if type_ == 'pmcid' else id_)
+        return citoid_data(citoid_query(type_, id_))
     except Exception:
         pass
-    # According to https://www.ncbi.nlm.nih.gov/pmc/tools/get-metadata/
-    if type_ == 'pmid':
-        json_response = request(PUBMED_URL + id_).json()
-    else:  # type_ == 'pmcid'
-        json_response = request(PMC_URL + id_).json()
+    d = ncbi_dict(id_, request(ncbi_url(type_, id_)).json())
+    if doi := d.get('doi'):
+        crossref_update(d, doi)
+    return d
+
+
+async def async_ncbi(type_: str, id_: str) -> dict:
+    try:
+        return await async_citoid_data(citoid_query(type_, id_))
+    except Exception:
+        pass
+    d = ncbi_dict(id_, (await async_request(ncbi_url(type_, id_))).json())
+    if doi := d.get('doi'):
+        await async_crossref_update(d, doi)
+    return d
+
+
+def ncbi_dict(id_: str, json_response: dict) -> dict:
     if 'error' in json_response:
         # Example error message if rates are exceeded:
         # {"error":"API rate limit exceeded","count":"11"}
@@ -61,17 +92,10 @@ def ncbi(type_: str, id_: str) -> dict:
         raise NCBIError(json_response)
     result_get = json_response['result'][id_].get
     d = {}
-    doi = None
     articleids = result_get('articleids', ())
     for articleid in articleids:
         if (idtype := articleid['idtype']) == 'doi':
-            doi = articleid['value']
-            crossref_dict = {}
-            crossref_thread = Thread(
-                target=crossref_update, args=(crossref_dict, doi)
-            )
-            crossref_thread.start()
-            d['doi'] = doi
+            d['doi'] = articleid['value']
         elif idtype == 'pmcid':
             # Use NON_DIGITS_SUB to remove the PMC prefix e.g. in PMC3539452
             d['pmcid'] = NON_DIGITS_SUB('', articleid['value'])
@@ -134,12 +158,6 @@ def ncbi(type_: str, id_: str) -> dict:
     if (lang := result_get('lang')) is not None:
         d['language'] = lang[0]
 
-    if doi:
-        # noinspection PyUnboundLocalVariable
-        crossref_thread.join()
-        # noinspection PyUnboundLocalVariable
-        d |= crossref_dict
-
     return d
 
 
@@ -152,3 +170,13 @@ def crossref_update(dct: dict, doi: str):
         logger.exception(
             'There was an error in resolving crossref DOI: ' + doi
         )
+
+
+async def async_crossref_update(dct: dict, doi: str):
+    # noinspection PyBroadException
+    try:
+        dct |= await async_crossref_data(doi)
+    except Exception:
+        logger.exception(
+            'There was an error in resolving crossref DOI: ' + doi
+        )
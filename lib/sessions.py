@@ -0,0 +1,65 @@
+"""A pool of HTTP sessions that can be shared by many threads."""
+
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from threading import Lock
+from typing import Generic, TypeVar
+
+S = TypeVar('S')
+
+
+class SessionPool(Generic[S]):
+    """A LIFO pool of sessions; each session is used by one thread at a time.
+
+    Citer runs requests in many short-lived threads. A session that keeps
+    its connections in thread-local handles would lose them with each
+    thread, so the pooled sessions should own a single handle instead.
+    The most recently returned session is reused first because it is the
+    most likely one to have a warm connection to the host. At most
+    max_idle sessions are kept; surplus ones are closed.
+    """
+
+    def __init__(self, factory: Callable[[], S], max_idle: int):
+        self.factory = factory
+        self.max_idle = max_idle
+        self.created = self.checkouts = self.in_use = self.closed = 0
+        self._idle: list[S] = []
+        self._lock = Lock()
+
+    @contextmanager
+    def session(self) -> Iterator[S]:
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            session = self._idle.pop() if self._idle else None
+        if session is None:
+            try:
+                session = self.factory()
+            except BaseException:
+                with self._lock:
+                    self.in_use -= 1
+                raise
+            with self._lock:
+                self.created += 1
+        try:
+            yield session
+        finally:
+            with self._lock:
+                self.in_use -= 1
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(session)
+                    session = None
+                else:
+                    self.closed += 1
+            if session is not None:
+                session.close()  # type: ignore
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                'created': self.created,
+                'checkouts': self.checkouts,
+                'in_use': self.in_use,
+                'idle': len(self._idle),
+                'closed': self.closed,
+            }
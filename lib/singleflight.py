@@ -0,0 +1,121 @@
+"""Coalesce concurrent identical calls into a single execution."""
+
+from asyncio import (
+    AbstractEventLoop,
+    CancelledError,
+    Future,
+    get_running_loop,
+    wait,
+)
+from collections.abc import Awaitable, Callable, Hashable
+from threading import Event, Lock
+from typing import Any
+from weakref import WeakKeyDictionary
+
+from lib.deadline import DeadlineExceeded, wait_timeout
+
+
+class _Call:
+    __slots__ = ('error', 'event', 'result')
+
+    def __init__(self):
+        self.event = Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """Let concurrent calls with the same key wait on one in-flight call.
+
+    The first caller (the leader) runs the function; callers that arrive
+    while it is running block and then share its result or exception.
+    A waiter gives up with DeadlineExceeded when its own request deadline
+    passes before the leader finishes.
+    If copy is given, the leader stores copy(result) before releasing the
+    waiters and each waiter receives its own copy of that snapshot. Use it
+    when callers mutate the result.
+    async_do does the same for coroutine functions; its calls are only
+    coalesced with those of the same event loop.
+    """
+
+    def __init__(self, copy: Callable[[Any], Any] | None = None):
+        self.copy = copy
+        self.coalesced = 0
+        self._calls: dict[Hashable, _Call] = {}
+        self._lock = Lock()
+        self._futures: WeakKeyDictionary[
+            AbstractEventLoop, dict[Hashable, Future]
+        ] = WeakKeyDictionary()
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs):
+        with self._lock:
+            if (call := self._calls.get(key)) is None:
+                call = self._calls[key] = _Call()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if leader is False:
+            if not call.event.wait(wait_timeout()):
+                raise DeadlineExceeded(f'deadline exceeded waiting for {key}')
+            if call.error is not None:
+                raise call.error
+            if (copy := self.copy) is None:
+                return call.result
+            return copy(call.result)
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        else:
+            if (copy := self.copy) is None:
+                call.result = result
+            else:
+                call.result = copy(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    async def async_do(
+        self, key: Hashable, func: Callable[..., Awaitable], *args, **kwargs
+    ):
+        loop = get_running_loop()
+        with self._lock:
+            if (futures := self._futures.get(loop)) is None:
+                futures = self._futures[loop] = {}
+
+        # futures is only used on the thread of loop, no lock is needed
+        while (future := futures.get(key)) is not None:
+            self.coalesced += 1
+            if not (await wait((future,), timeout=wait_timeout()))[0]:
+                raise DeadlineExceeded(f'deadline exceeded waiting for {key}')
+            if future.cancelled():  # the leader was cancelled, try again
+                continue
+            result = future.result()
+            if (copy := self.copy) is None:
+                return result
+            return copy(result)
+
+        future = futures[key] = loop.create_future()
+        try:
+            result = await func(*args, **kwargs)
+        except CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # retrieved, even if there are no waiters
+            raise
+        else:
+            if (copy := self.copy) is None:
+                future.set_result(result)
+            else:
+                future.set_result(copy(result))
+            return result
+        finally:
+            del futures[key]
@@ -0,0 +1,271 @@
+"""Per-upstream-host request policies used by lib.request."""
+
+from collections import OrderedDict, deque
+from sqlite3 import Connection, Error as SQLiteError
+from threading import Lock, local
+from time import monotonic, time
+
+from config import NCBI_API_KEY, RATE_LIMITS
+from lib.cache import CACHE_PATH, thread_connection
+
+try:
+    from uwsgi import numproc as WORKERS
+except ImportError:  # not running under uWSGI
+    WORKERS = 1
+
+# host -> allowed requests per second, shared by all worker processes
+DEFAULT_RATE_LIMITS = {
+    # https://www.ncbi.nlm.nih.gov/books/NBK25497/
+    'eutils.ncbi.nlm.nih.gov': 10 if NCBI_API_KEY else 3,
+    # https://www.crossref.org/documentation/retrieve-metadata/rest-api/
+    'api.crossref.org': 10,
+    # citoid, https://en.wikipedia.org/api/rest_v1/
+    'en.wikipedia.org': 50,
+}
+
+
+class TokenBucket:
+    """Allow `rate` events per second on average, in bursts of up to `burst`.
+
+    Callers that find the bucket empty reserve a future token and wait for
+    it, so bursts are queued in arrival order and served at the allowed
+    rate instead of being rejected.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None):
+        self.rate = rate
+        self.burst = rate if burst is None else burst
+        self._tokens = self.burst
+        self._updated = monotonic()
+        self._lock = Lock()
+
+    def _take(
+        self, tokens: float, elapsed: float, max_wait: float
+    ) -> tuple[float, float | None]:
+        """Return the tokens left and the wait for a token, as `reserve`."""
+        tokens = min(self.burst, tokens + max(elapsed, 0) * self.rate)
+        if (wait := (1 - tokens) / self.rate) > max_wait:
+            return tokens, None
+        return tokens - 1, max(wait, 0)
+
+    def reserve(self, max_wait: float) -> float | None:
+        """Take a token and return how long to wait before using it.
+
+        Return None, without taking a token, if the wait would exceed
+        max_wait.
+        """
+        with self._lock:
+            now = monotonic()
+            self._tokens, wait = self._take(
+                self._tokens, now - self._updated, max_wait
+            )
+            self._updated = now
+            return wait
+
+
+class SQLiteTokenBucket(TokenBucket):
+    """A TokenBucket whose state is kept in an SQLite database.
+
+    All worker processes using the same file share the bucket of host. If
+    the database cannot be used, the bucket of this process is used.
+    """
+
+    def __init__(
+        self, path: str, host: str, rate: float, burst: float | None = None
+    ):
+        super().__init__(rate, burst)
+        self.path = path
+        self.host = host
+        self._local = local()
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS token_buckets ('
+            'host TEXT PRIMARY KEY, tokens REAL, updated REAL)'
+        )
+
+    def _connection(self) -> Connection:
+        return thread_connection(self.path, self._local)
+
+    def reserve(self, max_wait: float) -> float | None:
+        try:
+            c = self._connection()
+            # take the write lock before reading, so that the read-modify-
+            # write is atomic across processes
+            c.execute('BEGIN IMMEDIATE')
+            try:
+                row = c.execute(
+                    'SELECT tokens, updated FROM token_buckets WHERE host = ?',
+                    (self.host,),
+                ).fetchone()
+                now = time()
+                tokens, updated = row or (self.burst, now)
+                tokens, wait = self._take(tokens, now - updated, max_wait)
+                c.execute(
+                    'INSERT OR REPLACE INTO token_buckets VALUES (?, ?, ?)',
+                    (self.host, tokens, now),
+                )
+            except BaseException:
+                c.execute('ROLLBACK')
+                raise
+            c.execute('COMMIT')
+        except SQLiteError:
+            return super().reserve(max_wait)
+        return wait
+
+
+def new_token_bucket(host: str, rate: float) -> TokenBucket:
+    """Return a bucket allowing rate requests per second to host in total.
+
+    The bucket is shared by all workers if CACHE_PATH is configured.
+    Otherwise each of the WORKERS processes gets an equal share of rate.
+    """
+    if CACHE_PATH:
+        return SQLiteTokenBucket(CACHE_PATH, host, rate)
+    return TokenBucket(rate / WORKERS, max(rate / WORKERS, 1))
+
+
+rate_limiters = {
+    host: new_token_bucket(host, rate)
+    for host, rate in (DEFAULT_RATE_LIMITS | RATE_LIMITS).items()
+    if rate
+}
+
+
+class CircuitBreaker:
+    """Stop sending requests to an upstream that keeps failing.
+
+    The circuit opens after `failure_threshold` consecutive failures.
+    While open, `allow` returns False. After `reset_timeout` seconds the
+    circuit is half-open and a single probe request is allowed; its success
+    closes the circuit, its failure reopens it for twice as long, up to
+    `max_reset_timeout`.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        max_reset_timeout: float = 300.0,
+    ):
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+        self._lock = Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if (
+                self._probing
+                or monotonic() < self.opened_at + self.reset_timeout
+            ):
+                return False
+            self._probing = True  # half-open
+            return True
+
+    def cancel(self) -> None:
+        """Forget an allowed request whose outcome says nothing about the
+        upstream, so that another probe may be sent.
+        """
+        with self._lock:
+            self._probing = False
+
+    def record(self, failed: bool) -> None:
+        with self._lock:
+            if not failed:
+                self.failures = 0
+                self.opened_at = None
+                self.reset_timeout = self.base_reset_timeout
+                self._probing = False
+                return
+            self.failures += 1
+            if self._probing:  # the probe failed
+                self._probing = False
+                self.reset_timeout = min(
+                    self.reset_timeout * 2, self.max_reset_timeout
+                )
+                self.opened_at = monotonic()
+            elif (
+                self.opened_at is None
+                and self.failures >= self.failure_threshold
+            ):
+                self.opened_at = monotonic()
+
+
+# API hosts whose outages should make resolvers skip to their fallbacks
+circuit_breakers = {
+    host: CircuitBreaker()
+    for host in (
+        'api.crossref.org',
+        'doi.org',
+        'en.wikipedia.org',
+        'eutils.ncbi.nlm.nih.gov',
+        'msapi.ketab.ir',
+        'search.worldcat.org',
+        'www.googleapis.com',
+    )
+}
+
+
+class LatencyTracker:
+    """Learn a timeout for each host from its recent response times.
+
+    The timeout of a host is `factor` times the 99th percentile of its
+    last `window` latencies, clamped to [floor, ceiling]. Hosts with fewer
+    than `min_samples` observations get the default timeout. Only the
+    `max_hosts` most recently observed hosts are remembered.
+    """
+
+    def __init__(
+        self,
+        default: float,
+        floor: float,
+        ceiling: float,
+        factor: float = 1.5,
+        window: int = 200,
+        min_samples: int = 20,
+        max_hosts: int = 500,
+    ):
+        self.default = default
+        self.floor = floor
+        self.ceiling = ceiling
+        self.factor = factor
+        self.window = window
+        self.min_samples = min_samples
+        self.max_hosts = max_hosts
+        self._latencies: OrderedDict[str, deque[float]] = OrderedDict()
+        self._timeouts: dict[str, float] = {}
+        self._lock = Lock()
+
+    def observe(self, host: str, seconds: float) -> None:
+        with self._lock:
+            latencies = self._latencies
+            if (samples := latencies.get(host)) is None:
+                samples = latencies[host] = deque(maxlen=self.window)
+                if len(latencies) > self.max_hosts:
+                    self._timeouts.pop(latencies.popitem(last=False)[0], None)
+            else:
+                latencies.move_to_end(host)
+            samples.append(seconds)
+            if len(samples) < self.min_samples:
+                return
+            ordered = sorted(samples)
+            p99 = ordered[min(int(len(ordered) * 0.99), len(ordered) - 1)]
+            self._timeouts[host] = min(
+                max(p99 * self.factor, self.floor), self.ceiling
+            )
+
+    def timeout(self, host: str | None) -> float:
+        return self._timeouts.get(host, self.default)  # type: ignore
+
+    def timeouts(self) -> dict[str, float]:
+        """Return the learned timeouts of hosts with enough samples."""
+        with self._lock:
+            return self._timeouts.copy()
@@ -1,19 +1,52 @@
+from codecs import (
+    BOM_UTF8,
+    BOM_UTF16_BE,
+    BOM_UTF16_LE,
+    getincrementaldecoder,
+    lookup as codecs_lookup,
+)
+from collections.abc import Callable
 from datetime import date as datetime_date
 from difflib import get_close_matches
 from functools import partial
 from html import unescape as html_unescape
-from threading import Thread
+from json import load as json_load
 from typing import Any, Protocol
 from urllib.parse import urlparse
 
 from curl_cffi import CurlError
 from langid import classify
+from regex import IGNORECASE, Match
 
-from lib import Response, logger, request
-from lib.citoid import citoid_data
-from lib.commons import ANYDATE_PATTERN, Search, find_any_date, rc
+from config import (
+    HOME_CACHE_SIZE,
+    HOME_CACHE_TTL,
+    HOME_SEED_PATH,
+    HTML_BODY_WINDOW,
+)
+from lib import (
+    Response,
+    Thread,
+    async_stream,
+    logger,
+    request,
+    time_is_short,
+)
+from lib.blocking import run_blocking
+from lib.cache import new_cache
+from lib.citoid import async_citoid_data, citoid_data
+from lib.commons import ANYDATE_PATTERN, find_any_date, rc
+from lib.deadline import check_deadline
 from lib.doi import crossref_data
-from lib.urls_authors import CONTENT_ATTR, IV, find_authors
+from lib.metrics import UPSTREAM_BYTES, caches, flights, upstream_label
+from lib.singleflight import SingleFlight
+from lib.urls_authors import (
+    IV,
+    find_authors,
+    find_meta_authors,
+)
+from lib.urls_jsonld import json_ld_data
+from lib.urls_meta import MetaIndex, meta_index
 
 
 class Joinable(Protocol):
@@ -22,26 +55,25 @@ class Joinable(Protocol):
 
 
 MAX_RESPONSE_LENGTH = 10_000_000  # in bytes
+HEAD_END = b'</head'
+# Bytes to buffer before choosing an encoding; the HTML standard prescans
+# the first 1024 bytes for a <meta> charset declaration.
+SNIFF_LENGTH = 1024
+BOMS = (
+    (BOM_UTF8, 'utf-8-sig'),
+    (BOM_UTF16_LE, 'utf-16'),
+    (BOM_UTF16_BE, 'utf-16'),
+)
+HEADER_CHARSET_SEARCH = rc(r'charset=["\']?([\w.:-]+)', IGNORECASE).search
+META_CHARSET_SEARCH = rc(
+    rb'<meta\b[^>]*?charset\s*=\s*["\']?\s*([\w.:-]+)', IGNORECASE
+).search
 
 
-TITLE_META_NAME_OR_PROP = r"""
-    (?>name|property)=(?<q>["\'])
-        (?>citation_title|title|Headline|og:title)
-    (?P=q)
-"""
-TITLE_SEARCH = rc(
-    r'<meta\s++(?:'
-    + TITLE_META_NAME_OR_PROP
-    + r'\s++'
-    + CONTENT_ATTR
-    + '|'
-    + CONTENT_ATTR
-    + r'\s++'
-    + TITLE_META_NAME_OR_PROP
-    + ')'
-    '|'
+TITLE_META_NAMES = ('citation_title', 'title', 'headline', 'og:title')
+TITLE_CLASS_SEARCH = rc(
     r'class=(?<q>["\'])(?>main-hed|heading1)(?P=q)[^>]++>(?<result>[^<]*+)<',
-    IV,
+    IGNORECASE,
 ).search
 
 TITLE_TAG = rc(
@@ -53,67 +85,26 @@ TITLE_TAG = rc(
     IV,
 ).search
 
-DATE_META_NAME_OR_PROP = r"""
-    (?>name|property)=(?<q>["\'])(?>
-        article:(?>modified_time|published_time)
-        |citation_(?>date|publication_date)
-        |date
-        |DC.date.[^'"\n>]*+
-        |last-modified
-        |pub_?date
-        |sailthru\.date
-    )(?P=q)
-"""
-DATE_CONTENT_ATTR = (
-    r'content=(?<q>["\'])(?>' + ANYDATE_PATTERN + r'|(?<year_only>\d{4})'
-    r'(?P=q))'
-)
-DATE_SEARCH = rc(
-    r'<meta\s+[^\n<]*?(?:'
-    + DATE_META_NAME_OR_PROP
-    + r'\s++[^\n<]*?'
-    + DATE_CONTENT_ATTR
-    + '|'
-    + DATE_CONTENT_ATTR
-    + r'\s++[^\n<]*?'
-    + DATE_META_NAME_OR_PROP
-    + ')'
-    '|'
-    # http://livescience.com/46619-sterile-neutrino-experiment-beginning.html
-    # https://www.thetimes.co.uk/article/woman-who-lost-brother-on-mh370-mourns-relatives-on-board-mh17-r07q5rwppl0
-    r'date(?>Published|line)[^\w]++' + ANYDATE_PATTERN,
-    IV,
+DATE_META_NAMES = {
+    'article:modified_time',
+    'article:published_time',
+    'citation_date',
+    'citation_publication_date',
+    'date',
+    'last-modified',
+    'pubdate',
+    'pub_date',
+    'sailthru.date',
+}
+DATE_CONTENT_MATCH = rc(
+    r'(?>' + ANYDATE_PATTERN + r'|(?<year_only>\d{4})\Z)', IV
+).match
+# http://livescience.com/46619-sterile-neutrino-experiment-beginning.html
+# https://www.thetimes.co.uk/article/woman-who-lost-brother-on-mh370-mourns-relatives-on-board-mh17-r07q5rwppl0
+DATE_TEXT_SEARCH = rc(
+    r'date(?>Published|line)[^\w]++' + ANYDATE_PATTERN, IV
 ).search
 
-
-def meta_searcher(names: list) -> Search:
-    name_or_prop = r'(?>name|property)=(?<q>["\'])\L<names>(?P=q)'
-    return rc(
-        r'<meta\s++[^\n<]*?(?:'
-        + CONTENT_ATTR
-        + r'\s++[^\n<]*?'
-        + name_or_prop
-        + '|'
-        + name_or_prop
-        + r'\s++[^\n<]*?'
-        + CONTENT_ATTR
-        + ')',
-        IV,
-        names=names,
-    ).search
-
-
-JOURNAL_TITLE_SEARCH = meta_searcher(['citation_journal_title'])
-PUBLISHER_SEARCH = meta_searcher(['DC.publisher', 'citation_publisher'])
-ISSN_SEARCH = meta_searcher(['citation_issn'])
-PMID_SEARCH = meta_searcher(['citation_pmid'])
-DOI_SEARCH = meta_searcher(['citation_doi'])
-VOLUME_SEARCH = meta_searcher(['citation_volume'])
-ISSUE_SEARCH = meta_searcher(['citation_issue'])
-FIRST_PAGE_SEARCH = meta_searcher(['citation_firstpage'])
-LAST_PAGE_SEARCH = meta_searcher(['citation_lastpage'])
-SITE_NAME_SEARCH = meta_searcher(['og:site_name'])
-
 TITLE_SEPS = {' - ', ' — ', '|'}  # keep ins sync with <1>
 TITLE_SPLIT = rc(r'\L<title_seps>', title_seps=TITLE_SEPS).split
 LANG_SEARCH = rc(r'\slang=["\']?([a-z]{2})\b').search
@@ -126,104 +117,143 @@ class ContentTypeError(ValueError):
 
 
 class ContentLengthError(ValueError):
-    """Raise when content-length header indicates a very long content."""
+    """Raise when the content is, or is declared to be, too long."""
 
 
 # inaccurate but should be faster than lxml
 # https://stackoverflow.com/questions/14694482/converting-html-to-text-with-python
 to_text = partial(rc(r'<[^>]*+>').sub, '')
+BODY_SEARCH = rc(r'<body\b', IGNORECASE).search
+INVISIBLE_SUB = partial(
+    rc(
+        r'<(script|style|noscript|template)\b[^>]*+>[\s\S]*?</\1\s*+>'
+        r'|<!--[\s\S]*?-->',
+        IGNORECASE,
+    ).sub,
+    '',
+)
+TAGS_TO_SPACE = partial(rc(r'<[^>]*+>').sub, ' ')
+SPACES_SUB = partial(rc(r'\s++').sub, ' ')
+# Language detection is limited to the visible text in this many characters
+# of html after <body, and to this many characters of that text.
+LANG_SCAN_LENGTH = 131_072
+LANG_SAMPLE_LENGTH = 4_096
 
 
-def find_journal(html: str) -> str | None:
+def find_journal(meta: MetaIndex) -> str | None:
     """Return journal title as a string."""
     # http://socialhistory.ihcs.ac.ir/article_319_84.html
-    if (m := JOURNAL_TITLE_SEARCH(html)) is not None:
-        return m['result']
+    return meta.get('citation_journal_title')
 
 
-def find_publisher(html: str) -> str | None:
-    if (m := PUBLISHER_SEARCH(html)) is None:
+def find_publisher(meta: MetaIndex) -> str | None:
+    if (publisher := meta.get('dc.publisher', 'citation_publisher')) is None:
         return None
-    publisher = m['result']
     if '|' in publisher:
         return None
     return publisher
 
 
-def find_issn(html: str) -> str | None:
+def find_issn(meta: MetaIndex) -> str | None:
     r"""Return International Standard Serial Number as a string.
 
     Normally ISSN should be in the  '\d{4}\-\d{3}[\dX]' format, but this
     function does not check that.
     """
-    if (m := ISSN_SEARCH(html)) is not None:
-        return m['result']
+    return meta.get('citation_issn')
 
 
-def find_pmid(html: str) -> str | None:
+def find_pmid(meta: MetaIndex) -> str | None:
     """Return pmid as a string."""
-    if (m := PMID_SEARCH(html)) is not None:
-        return m['result']
+    return meta.get('citation_pmid')
 
 
-def find_doi(html: str) -> str | None:
+def find_doi(meta: MetaIndex) -> str | None:
     """Return DOI as a string."""
-    if (m := DOI_SEARCH(html)) is not None:
-        return m['result']
+    return meta.get('citation_doi')
 
 
-def find_volume(html: str) -> str | None:
+def find_volume(meta: MetaIndex) -> str | None:
     """Return citatoin volume number as a string."""
-    if (m := VOLUME_SEARCH(html)) is not None:
-        return m['result']
+    return meta.get('citation_volume')
 
 
-def find_issue(html: str) -> str | None:
+def find_issue(meta: MetaIndex) -> str | None:
     """Return citation issue number as a string."""
-    if (m := ISSUE_SEARCH(html)) is not None:
-        return m['result']
+    return meta.get('citation_issue')
 
 
-def find_pages(html: str) -> str | None:
+def find_pages(meta: MetaIndex) -> str | None:
     """Return citation pages as a string."""
     # http://socialhistory.ihcs.ac.ir/article_319_84.html
-    if fp_match := FIRST_PAGE_SEARCH(html):
-        if lp_match := LAST_PAGE_SEARCH(html):
-            return fp_match['result'] + '–' + lp_match['result']
+    if first_page := meta.get('citation_firstpage'):
+        if last_page := meta.get('citation_lastpage'):
+            return first_page + '–' + last_page
+
+
+def is_date_meta_name(name: str) -> bool:
+    return name in DATE_META_NAMES or name.startswith('dc.date.')
+
+
+def search_title(html: str, meta: MetaIndex) -> str | None:
+    """Return the first title found in meta tags or heading classes."""
+    pos, title = meta.first(TITLE_META_NAMES, leading=True) or (
+        len(html),
+        None,
+    )
+    if (m := TITLE_CLASS_SEARCH(html, 0, pos)) is not None:
+        return m['result']
+    return title
+
+
+def search_date(html: str, meta: MetaIndex) -> Match | None:
+    """Return the first date match in meta tags or `datePublished` text."""
+    end = len(html)
+    date_match = None
+    for pos, content in meta.entries(is_date_meta_name):
+        if (date_match := DATE_CONTENT_MATCH(content)) is not None:
+            end = pos
+            break
+    return DATE_TEXT_SEARCH(html, 0, end) or date_match
 
 
 HomeList = list[str | None]
 
 
 def find_site_name(
-    html: str,
+    meta: MetaIndex,
     html_title: str | None,
     url: str,
     hostname: str,
     authors: list[tuple[str, str]],
     home_list: HomeList,
     thread: Joinable,
+    json_ld_site_name: str | None = None,
 ) -> str:
     """Return (site's name as a string, where).
 
     Parameters:
-        html: The html string of the page being processed.
+        meta: The MetaIndex of the page being processed.
         html_title: Title of the page found in the title tag of the html.
         url: URL of the page.
         hostname: urlparse(url).hostname.removeprefix('www.')
         authors: Authors list returned from find_authors function.
         home_list: A list containing the title of the home page as a str.
         thread: The thread that should be joined before using home_title list.
+        json_ld_site_name: The publisher name found in the JSON-LD of the
+            page, preferred over the home page.
     Returns site's name as a string.
     """
-    if (m := SITE_NAME_SEARCH(html)) is not None:
-        return m['result'].partition('|')[0].rstrip()
+    if (site_name := meta.get('og:site_name')) is not None:
+        return site_name.partition('|')[0].rstrip()
     # search the title
     if html_title is not None:
         if site_name := parse_title(
             html_title, hostname, authors, home_list, thread
         )[2]:
             return site_name
+    if json_ld_site_name is not None:
+        return json_ld_site_name
     # noinspection PyBroadException
     try:
         # using home_title
@@ -245,27 +275,19 @@ def find_site_name(
     return hostname
 
 
-def find_title(
-    html: str,
-    html_title: str | None,
-    hostname: str,
-    authors: list[tuple[str, str]],
-    home_list: HomeList,
-    thread: Joinable,
-) -> str | None:
-    """Return (title_string, where_info)."""
-    if (m := TITLE_SEARCH(html)) is not None:
-        return parse_title(
-            html_unescape(m['result']),
-            hostname,
-            authors,
-            home_list,
-            thread,
-        )[1]
-    elif html_title is not None:
-        return parse_title(html_title, hostname, authors, home_list, thread)[1]
-    else:
+def headline_title(title: str | None, headline: str | None) -> str | None:
+    """Return headline if it is one of the parts of title.
+
+    The other parts are then known to be the site name, author, etc. and
+    title needs no parsing.
+    """
+    if title is None or headline is None:
         return None
+    headline = html_unescape(headline).strip()
+    for part in TITLE_SPLIT(title):
+        if part.strip() == headline:
+            return headline
+    return None
 
 
 def parse_title(
@@ -354,25 +376,26 @@ def parse_title(
     return intitle_author, pure_title, intitle_sitename
 
 
-def find_date(html: str, url: str) -> datetime_date | str | None:
+def find_date(
+    html: str, meta: MetaIndex, json_ld: dict[str, Any], url: str
+) -> datetime_date | str | None:
     """Return the date of the document."""
     # Example for find_any_date(url):
     # http://ftalphaville.ft.com/2012/05/16/1002861/recap-and-tranche-primer/?Authorised=false
     # Example for find_any_date(html):
     # https://www.bbc.com/news/uk-england-25462900
-    if (m := DATE_SEARCH(html)) is not None:
-        return m['year_only'] or find_any_date(m)
-    return find_any_date(url) or find_any_date(html)
+    if (m := search_date(html, meta)) is not None:
+        return m.groupdict().get('year_only') or find_any_date(m)
+    return find_any_date(url) or json_ld.get('date') or find_any_date(html)
 
 
-def _analyze_home(parsed_url: tuple, home_list: HomeList) -> None:
-    """Append home_title and site_name to home_list.
+def _analyze_home(home_url: str, home_list: HomeList) -> None:
+    """Set site_name and home_title of home_list and cache them.
 
     home_list is used to return the thread result.
     """
-    home_url = '://'.join(parsed_url[:2])
     try:
-        r, html = url_text(home_url)
+        r, html = url_text(home_url, head_is_enough)
     except (
         CurlError,
         ContentTypeError,
@@ -380,26 +403,48 @@ def _analyze_home(parsed_url: tuple, home_list: HomeList) -> None:
     ):
         return None
 
-    if m := SITE_NAME_SEARCH(html):
-        home_list[0] = m['result']
+    home_list[0] = meta_index(html).get('og:site_name')
 
     m = TITLE_TAG(html)
     title = html_unescape(m['result']) if m else None
     home_list[1] = title
+    home_cache.set(home_url, home_list, HOME_CACHE_TTL)
+
+
+def load_home_seeds(path: str | None) -> dict[str, HomeList]:
+    """Load {'scheme://host': [site_name, home_title]} from a JSON file."""
+    if path is None:
+        return {}
+    try:
+        with open(path, encoding='utf8') as f:
+            return json_load(f)
+    except (OSError, ValueError):
+        logger.exception('could not load HOME_SEED_PATH')
+        return {}
+
+
+# (site_name, home_title) of home pages, by scheme://host
+home_cache = caches['home'] = new_cache('home', HOME_CACHE_SIZE)
+home_seeds = load_home_seeds(HOME_SEED_PATH)
 
 
 def analyze_home(
     parsed_url: tuple, check_home=True, /
 ) -> tuple[Joinable, HomeList]:
-    home_list: HomeList = [None, None]
-    if check_home is True:
-        home_thread = Thread(
-            target=_analyze_home, args=(parsed_url, home_list)
-        )
-        home_thread.start()
-    else:
-        home_thread = Joinable
-
+    if check_home is not True:
+        return Joinable, [None, None]
+    home_url = '://'.join(parsed_url[:2])
+    if (home_list := home_seeds.get(home_url)) is not None:
+        return Joinable, [*home_list]
+    if (home_list := home_cache.get(home_url)) is not None:
+        return Joinable, home_list
+    home_list = [None, None]
+    # The home page is only used for guessing the site name; skip it when
+    # the request is running out of time.
+    if time_is_short('home page'):
+        return Joinable, home_list
+    home_thread = Thread(target=_analyze_home, args=(home_url, home_list))
+    home_thread.start()
     return home_thread, home_list
 
 
@@ -420,26 +465,202 @@ def check_response(r: Response) -> None:
         )
 
 
-def url_text(url: str) -> tuple[str, str]:
+def head_is_enough(_: str) -> bool:
+    # _analyze_home only looks for og:site_name and the title tag.
+    return True
+
+
+def has_url_data_fields(html: str) -> bool:
+    """Return True if url_data does not need more of the page than html.
+
+    This is the case when the page has a DOI, or when none of the fallbacks
+    that search the body (byline, body dates, language detection, heading
+    classes) will be needed.
+    """
+    meta = meta_index(html)
+    if find_doi(meta) is not None:
+        return True
+    return bool(
+        search_title(html, meta)
+        and search_date(html, meta)
+        and LANG_SEARCH(html)
+        and find_meta_authors(meta)
+    )
+
+
+def sniff_encoding(r: Response, prefix: bytes) -> str:
+    """Return the encoding of a page that starts with prefix.
+
+    A byte order mark takes precedence over the charset of the content-type
+    header, which takes precedence over a <meta> charset declaration.
+    """
+    for bom, encoding in BOMS:
+        if prefix.startswith(bom):
+            return encoding
+    candidates = []
+    if (content_type := r.headers.get('content-type')) is not None:
+        if m := HEADER_CHARSET_SEARCH(content_type):
+            candidates.append(m[1])
+    if m := META_CHARSET_SEARCH(prefix):
+        candidates.append(m[1].decode('ascii'))
+    candidates.append(r.encoding)
+    for name in candidates:
+        try:
+            return codecs_lookup(name).name
+        except LookupError:
+            continue
+    return 'utf-8'
+
+
+class PageReader:
+    """Decode a streamed page and decide when to stop reading it.
+
+    The impersonated browser headers offer br, zstd and gzip; curl decodes
+    the body as it streams in, so the chunks are decoded ones. The budget
+    therefore applies to decoded bytes and a compression bomb is aborted as
+    soon as it exceeds MAX_RESPONSE_LENGTH, while the transfer itself stays
+    compressed.
+    """
+
+    __slots__ = (
+        'check_at',
+        'decode',
+        'enough',
+        'html',
+        'parts',
+        'pending',
+        'r',
+        'size',
+        'tail',
+        'url',
+    )
+
+    def __init__(
+        self, url: str, r: Response, enough: Callable[[str], bool] | None
+    ):
+        self.url = url
+        self.r = r
+        self.enough = enough
+        self.size = 0
+        # The page is decoded as it streams in; only the decoded parts are
+        # kept.
+        self.parts: list[str] = []
+        self.decode: Callable | None = None
+        self.pending = b''
+        self.html: str | None = None
+        # Once `</head` and HTML_BODY_WINDOW more bytes have arrived, ask
+        # `enough` whether the rest of the page is needed.
+        self.check_at: int | None = None
+        self.tail = b''
+
+    def feed(self, chunk: bytes) -> bool:
+        """Decode chunk; return True if the rest of the page is not needed."""
+        check_deadline(self.url)
+        size = self.size = self.size + len(chunk)
+        if size > MAX_RESPONSE_LENGTH:
+            raise ContentLengthError(
+                f'decoded response was too large: {size=:,} bytes'
+            )
+        if (decode := self.decode) is None:
+            self.pending += chunk
+            if size < SNIFF_LENGTH:
+                return False
+            decode = self.decode = getincrementaldecoder(
+                sniff_encoding(self.r, self.pending)
+            )('replace').decode
+            chunk, self.pending = self.pending, b''
+        parts = self.parts
+        parts.append(decode(chunk))
+        if (enough := self.enough) is None:
+            return False
+        if (check_at := self.check_at) is None:
+            # `</head` may be split between chunks
+            start = size - len(chunk) - len(self.tail)
+            data = self.tail + chunk
+            if (i := data.lower().find(HEAD_END)) == -1:
+                self.tail = data[1 - len(HEAD_END) :]
+                return False
+            check_at = self.check_at = start + i + HTML_BODY_WINDOW
+        if size < check_at:
+            return False
+        html = ''.join(parts)
+        if enough(html):
+            self.html = html
+            return True
+        self.enough = None  # read the whole page
+        return False
+
+    def text(self) -> str:
+        """Return the page, or its beginning if `feed` returned True."""
+        UPSTREAM_BYTES.inc(upstream_label(self.url), amount=self.size)
+        if self.html is not None:
+            return self.html
+        if (decode := self.decode) is None:  # shorter than SNIFF_LENGTH
+            decode = getincrementaldecoder(
+                sniff_encoding(self.r, self.pending)
+            )('replace').decode
+        self.parts.append(decode(self.pending, True))
+        return ''.join(self.parts)
+
+
+def _url_text(
+    url: str, enough: Callable[[str], bool] | None = None
+) -> tuple[str, str]:
     with request(url, spoof=True, stream=True) as r:
         check_response(r)
-        size = 0
-        chunks = []
-        a = chunks.append
+        reader = PageReader(url, r, enough)
         for chunk in r.iter_content():
-            size += len(chunk)
-            if size >= MAX_RESPONSE_LENGTH:
-                raise ValueError(
-                    f'response was too large: {size=} > {MAX_RESPONSE_LENGTH=}'
-                )
-            a(chunk)
+            if reader.feed(chunk):
+                break
+        return r.url, reader.text()
 
-        content = b''.join(chunks)
-        # if content is None:
-        #     return
-        html = content.decode(r.encoding, errors='replace')
 
-        return r.url, html
+async def _async_url_text(
+    url: str, enough: Callable[[str], bool] | None = None
+) -> tuple[str, str]:
+    async with async_stream(url, spoof=True) as r:
+        check_response(r)
+        reader = PageReader(url, r, enough)
+        async for chunk in r.aiter_content():
+            if reader.feed(chunk):
+                break
+        return r.url, reader.text()
+
+
+# Streamed responses cannot be shared, so coalescing happens at this level.
+url_text_flight = flights['url_text'] = SingleFlight()
+
+
+def text_sample(html: str, title: str | None) -> str:
+    """Return title and the beginning of the visible text of html."""
+    start = m.start() if (m := BODY_SEARCH(html)) is not None else 0
+    text = TAGS_TO_SPACE(INVISIBLE_SUB(html[start : start + LANG_SCAN_LENGTH]))
+    text = SPACES_SUB(html_unescape(text)).strip()[:LANG_SAMPLE_LENGTH]
+    return f'{title}\n{text}' if title else text
+
+
+def url_text(
+    url: str, enough: Callable[[str], bool] | None = None
+) -> tuple[str, str]:
+    """Return (final_url, html) of the given url.
+
+    If `enough` is given, html may only be the beginning of the page; see
+    _url_text.
+    """
+    if HTML_BODY_WINDOW is None:
+        enough = None
+    return url_text_flight.do((url, enough), _url_text, url, enough)
+
+
+async def async_url_text(
+    url: str, enough: Callable[[str], bool] | None = None
+) -> tuple[str, str]:
+    """Like url_text, without blocking the running event loop."""
+    if HTML_BODY_WINDOW is None:
+        enough = None
+    return await url_text_flight.async_do(
+        (url, enough), _async_url_text, url, enough
+    )
 
 
 def url_data(
@@ -454,7 +675,7 @@ def url_data(
     """
     if html is None:
         try:
-            url, html = url_text(url)
+            url, html = url_text(url, has_url_data_fields)
         except CurlError:
             # sometimes get_html fails (is blacklisted), but zotero works
             # issues/47
@@ -468,8 +689,9 @@ def url_data(
             return {'url': url, 'cite_type': 'web'}
 
     d: dict[str, Any] = {'url': url}
+    meta = meta_index(html)
 
-    if doi := find_doi(html):
+    if doi := find_doi(meta):
         # noinspection PyBroadException
         try:
             return crossref_data(doi)
@@ -483,18 +705,33 @@ def url_data(
     else:
         html_title = None
     # d['html_title'] is used in waybackmechine.py.
-    if authors := find_authors(html):
+    json_ld = json_ld_data(html)
+    if authors := find_authors(html, meta, json_ld):
         d['authors'] = authors
-    d['issn'] = find_issn(html)
-    d['pmid'] = find_pmid(html)
-    d['volume'] = find_volume(html)
-    d['issue'] = find_issue(html)
-    d['page'] = find_pages(html)
-    d['journal'] = find_journal(html)
-    publisher = d['publisher'] = find_publisher(html)
+    d['issn'] = find_issn(meta)
+    d['pmid'] = find_pmid(meta)
+    d['volume'] = find_volume(meta)
+    d['issue'] = find_issue(meta)
+    d['page'] = find_pages(meta)
+    d['journal'] = find_journal(meta)
+    publisher = d['publisher'] = find_publisher(meta)
 
     parsed_url = urlparse(url)
     hostname = parsed_url.hostname.removeprefix('www.')  # type: ignore
+    page_title = search_title(html, meta)
+    if page_title is None:
+        page_title = html_title
+    else:
+        page_title = html_unescape(page_title)
+    title = headline_title(page_title, json_ld.get('title'))
+    if title is not None and (
+        d['journal']
+        or publisher is not None
+        or meta.get('og:site_name') is not None
+        or 'website' in json_ld
+    ):
+        # neither the title nor the site name needs the home page
+        check_home = False
     home_thread, home_list = analyze_home(parsed_url, check_home)
 
     if d['journal']:
@@ -503,26 +740,43 @@ def url_data(
         d['cite_type'] = 'web'
         if publisher is None:
             d['website'] = find_site_name(
-                html,
+                meta,
                 html_title,
                 url,
                 hostname,
                 authors,
                 home_list,
                 home_thread,
+                json_ld.get('website'),
             ).partition(',')[0]
-    if (
-        title := find_title(
-            html, html_title, hostname, authors, home_list, home_thread
-        )
-    ) is not None:
+    if title is None and page_title is not None:
+        title = parse_title(
+            page_title, hostname, authors, home_list, home_thread
+        )[1]
+    if title is not None:
         d['title'] = title.strip()
-    if date := find_date(html, url):
+    if date := find_date(html, meta, json_ld, url):
         d['date'] = date
 
     if (lang_match := LANG_SEARCH(html)) is not None:
         d['language'] = lang_match[1]
     else:
-        d['language'] = classify(html)[0]
+        d['language'] = classify(text_sample(html, d.get('title')))[0]
 
     return d
+
+
+async def async_url_data(url: str) -> dict[str, Any]:
+    """Like url_data, with the page fetched on the running event loop.
+
+    Parsing the page, which may fetch its home page or Crossref data, runs
+    on asgi_executor.
+    """
+    try:
+        url, html = await async_url_text(url, has_url_data_fields)
+    except CurlError:
+        # see url_data
+        return {'url': url, **await async_citoid_data(url, True)}
+    except ContentTypeError:
+        return {'url': url, 'cite_type': 'web'}
+    return await run_blocking(partial(url_data, url, html=html))
@@ -1,5 +1,3 @@
-from json import JSONDecodeError, loads
-
 from regex import ASCII, IGNORECASE, VERBOSE
 
 from lib import four_digit_num
@@ -9,6 +7,7 @@ from lib.commons import (
     first_last,
     rc,
 )
+from lib.urls_meta import MetaIndex, meta_index
 
 IV = IGNORECASE | VERBOSE
 # Names in byline are required to be two or three parts
@@ -81,27 +80,15 @@ CONTENT_ATTR = r"""
         )++
     )(?P=q)
 """
-AUTHOR_META_NAME_OR_PROP = r"""
-    (?<id>(?:name|property)\s*+=\s*+(?<q>["\']?)
-        (?>
-            # http://socialhistory.ihcs.ac.ir/article_571_84.html
-            # http://jn.physiology.org/content/81/1/319
-            a(?>rticle:author|uthor)
-            |citation_authors?
-            |og:author
-        )
-    (?P=q))
-"""
-META_AUTHOR_FINDITER = rc(
-    rf"""
-    <meta\s[^>]*?(?:
-        {AUTHOR_META_NAME_OR_PROP}\s[^c]*+[^>]*?{CONTENT_ATTR}
-        |
-        {CONTENT_ATTR}\s[^>]*?{AUTHOR_META_NAME_OR_PROP}
-    )
-    """,
-    IV,
-).finditer
+# http://socialhistory.ihcs.ac.ir/article_571_84.html
+# http://jn.physiology.org/content/81/1/319
+AUTHOR_META_NAMES = (
+    'article:author',
+    'author',
+    'citation_author',
+    'citation_authors',
+    'og:author',
+)
 # id=byline
 # http://www.washingtonpost.com/wp-dyn/content/article/2006/12/20/AR2006122002165.html
 # rel=author
@@ -132,10 +119,6 @@ BYLINE_TAG_FINDITER = rc(
         |
         # http://www.dailymail.co.uk/news/article-2633025/London-cleric-convicted-NYC-terrorism-trial.html
         (?<id>authorName["\']?\s*+:\s*+["\'])(?<result>[^"\'>\n]++)["\']
-        |
-        # schema.org
-        (?<q>["'])(?<id>author)(?P=q)\s*+:\s*+
-        (?<result> \{ [^\}]* \} | \[ [^\]]* \] )
     )
     """,
     IV | ASCII,
@@ -180,42 +163,34 @@ STOPWORDS_SEARCH = rc(
 ).search
 
 
-def json_ld_authors(s: str) -> list[tuple[str, str]] | None:
-    try:
-        j = loads(s)
-    except JSONDecodeError:
-        return
-    try:
-        if type(j) is list:
-            ns = []
-            for d in j:
-                if d['@type'] == 'Person':
-                    ns += byline_to_names(d['name'])
-            return ns
+def find_meta_authors(meta: MetaIndex) -> list[tuple[str, str]]:
+    """Return authors names found in the meta tags of a page."""
+    names = []
+    for _, content in meta.entries(AUTHOR_META_NAMES, exact=False):
+        if match_names := byline_to_names(content):
+            names += match_names
+    # meta authors may contain duplicate names.
+    # Only return unique authors, preserving the order.
+    return [*dict.fromkeys(names)]
+
+
+def find_authors(
+    html, meta: MetaIndex | None = None, json_ld: dict | None = None
+) -> list[tuple[str, str]]:
+    """Return authors names found in html.
 
-        # assert type(j) is dict
-        if j['@type'] == 'Person':
-            if type(j['name']) is str:
-                return byline_to_names(j['name'])
-            # assert type(j['name']) is list
-            ns = []
-            for n in j['name']:
-                ns += byline_to_names(n)
-            return ns
-    except (KeyError, TypeError):
-        return
+    json_ld is the result of lib.urls_jsonld.json_ld_data for html.
+    """
+    if names := find_meta_authors(meta_index(html) if meta is None else meta):
+        return names
+    if json_ld is not None and (names := json_ld.get('authors')):
+        return names
+    return find_byline_tag_authors(html) or find_byline_text_authors(html)
 
 
-def find_authors(html) -> list[tuple[str, str]]:
-    """Return authors names found in html."""
+def find_byline_tag_authors(html) -> list[tuple[str, str]]:
+    """Return authors names found in byline tags of html."""
     names = []
-    for match in META_AUTHOR_FINDITER(html):
-        if match_names := byline_to_names(match['result']):
-            names += match_names
-    if names:
-        # meta authors may contain duplicate names.
-        # Only return unique authors, preserving the order.
-        return [*dict.fromkeys(names)]
     match_id = None
     results = set()
     for match in BYLINE_TAG_FINDITER(html):
@@ -236,17 +211,17 @@ def find_authors(html) -> list[tuple[str, str]]:
             if names:
                 return names
         else:  # not containing tags
-            if match['id'] == 'author':
-                if ns := json_ld_authors(match['result']):
-                    return ns
             if ns := byline_to_names(result):
                 match_id = match['id']
                 names += ns
-    if names:
-        return names
+    return names
+
+
+def find_byline_text_authors(html) -> list[tuple[str, str]]:
+    """Return authors names found in a byline in the text of html."""
     if (match := BYLINE_TEXT_PATTERN(TAGS_SUB('', html))) is not None:
         return byline_to_names(match[0])
-    return names
+    return []
 
 
 def byline_to_names(byline) -> list[tuple[str, str]]:
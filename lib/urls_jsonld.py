@@ -0,0 +1,122 @@
+"""Citation data from the schema.org JSON-LD blocks of a page."""
+
+from json import JSONDecodeError, loads
+from typing import Any
+
+from regex import IGNORECASE, VERBOSE
+
+from lib.commons import find_any_date, rc
+from lib.urls_authors import byline_to_names
+
+JSON_LD_FINDITER = rc(
+    r"""
+    <script\b[^>]*?\btype=(?<q>["\']?)application/ld\+json(?P=q)[^>]*+>
+    (?<json>[\s\S]*?)
+    </script\s*+>
+    """,
+    IGNORECASE | VERBOSE,
+).finditer
+ISO_DATE_MATCH = rc(r'(\d{4})-(\d\d)-(\d\d)').match
+
+# https://schema.org/Article and its most used subtypes
+ARTICLE_TYPES = {
+    'AnalysisNewsArticle',
+    'Article',
+    'BlogPosting',
+    'NewsArticle',
+    'OpinionNewsArticle',
+    'Report',
+    'ReportageNewsArticle',
+    'ScholarlyArticle',
+    'TechArticle',
+}
+
+
+def iter_items(j: Any):
+    """Yield every JSON-LD node, including those inside @graph."""
+    if type(j) is list:
+        for i in j:
+            yield from iter_items(i)
+    elif type(j) is dict:
+        yield j
+        if (graph := j.get('@graph')) is not None:
+            yield from iter_items(graph)
+
+
+def is_article(item: dict) -> bool:
+    type_ = item.get('@type')
+    if type(type_) is list:
+        return not ARTICLE_TYPES.isdisjoint(type_)
+    return type_ in ARTICLE_TYPES
+
+
+def find_article(html: str) -> dict | None:
+    """Return the first schema.org Article node of html."""
+    for match in JSON_LD_FINDITER(html):
+        try:
+            j = loads(match['json'])
+        except JSONDecodeError:
+            continue
+        for item in iter_items(j):
+            if is_article(item):
+                return item
+    return None
+
+
+def name_of(value: Any) -> str | None:
+    if type(value) is list:
+        value = value[0] if value else None
+    if type(value) is dict:
+        value = value.get('name')
+    if type(value) is str and (value := value.strip()):
+        return value
+    return None
+
+
+def authors_of(value: Any) -> list[tuple[str, str]]:
+    """Return the names of the Person nodes of value.
+
+    Authors given as plain strings are ignored; some sites, e.g. BBC, put
+    the name of an editor there.
+    """
+    names = []
+    for author in value if type(value) is list else [value]:
+        if type(author) is not dict or (
+            author.get('@type', 'Person') != 'Person'
+        ):
+            continue
+        name = author.get('name')
+        for name in name if type(name) is list else [name]:
+            if type(name) is str:
+                names += byline_to_names(name)
+    return [*dict.fromkeys(names)]
+
+
+def date_of(value: Any):
+    if type(value) is not str:
+        return None
+    if (m := ISO_DATE_MATCH(value)) is not None:
+        return find_any_date(f'{m[1]}-{m[2]}-{m[3]}')
+    return find_any_date(value)
+
+
+def json_ld_data(html: str) -> dict[str, Any]:
+    """Return the title, authors, date and website of the article in html.
+
+    Only fields found in the first schema.org Article JSON-LD node are
+    included.
+    """
+    if (article := find_article(html)) is None:
+        return {}
+    d: dict[str, Any] = {}
+    if title := name_of(article.get('headline')):
+        d['title'] = title
+    if authors := authors_of(article.get('author')):
+        d['authors'] = authors
+    if date := date_of(article.get('datePublished')):
+        d['date'] = date
+    if website := name_of(article.get('publisher')) or name_of(
+        article.get('isPartOf')
+    ):
+        d['website'] = website
+    return d
@@ -0,0 +1,199 @@
+"""A single-pass index of the <meta> tags of a page.
+
+The index is built by one of the ENGINES, selected with the
+EXTRACTION_ENGINE setting. dev/benchmark_extraction.py compares their
+speed and accuracy.
+"""
+
+from collections.abc import Callable, Iterable
+
+from lxml.etree import HTMLPullParser
+from regex import IGNORECASE, VERBOSE
+
+from config import EXTRACTION_ENGINE
+from lib.commons import rc
+
+META_TAG_FINDITER = rc(
+    r"""
+    <meta
+    (?<attrs>(?:
+        \s++[^\s=>/]++
+        (?:\s*+=\s*+(?>"[^"]*+"|'[^']*+'|[^\s>]++))?
+    )*+)
+    \s*+/?>
+    """,
+    IGNORECASE | VERBOSE,
+).finditer
+ATTR_FINDITER = rc(
+    r"""
+    (?<attr>[^\s=>/]++)
+    (?:
+        (?<eq>\s*+=\s*+)
+        (?>"(?<dq>[^"]*+)"|'(?<sq>[^']*+)'|(?<uq>[^\s>]++))
+    )?
+    """,
+    VERBOSE,
+).finditer
+# Pages are fed to lxml in chunks so that it can stop at </head>.
+LXML_CHUNK_SIZE = 16_384
+
+# name or property -> [(position of the tag, content, exact, leading)]
+Contents = dict[str, list[tuple[int, str, bool, bool]]]
+
+
+class MetaIndex:
+    """Contents of the <meta> tags of a page, by name and property.
+
+    Names and properties are lower-cased. Only tags with a non-empty
+    content attribute are indexed. A name is exact if it is quoted and has
+    no spaces around its `=`; most lookups only consider exact names. A
+    name is leading if it and the content are the first two attributes of
+    the tag.
+    """
+
+    __slots__ = ('_contents',)
+
+    def __init__(self, contents: Contents):
+        self._contents = contents
+
+    def entries(
+        self,
+        names: Iterable[str] | Callable[[str], bool],
+        exact=True,
+        leading=False,
+    ) -> list[tuple[int, str]]:
+        """Return (position, content) of tags with any of the given names.
+
+        `names` may also be a predicate on the lower-cased name. The result
+        is in document order.
+        """
+        contents = self._contents
+        if callable(names):
+            lists = [v for k, v in contents.items() if names(k)]
+        else:
+            lists = [v for k in names if (v := contents.get(k)) is not None]
+        # a tag may have both a matching name and a matching property
+        return sorted(
+            {
+                pos: (pos, content)
+                for entries in lists
+                for pos, content, is_exact, is_leading in entries
+                if (is_exact or not exact) and (is_leading or not leading)
+            }.values()
+        )
+
+    def first(
+        self, names: Iterable[str] | Callable[[str], bool], leading=False
+    ) -> tuple[int, str] | None:
+        if entries := self.entries(names, leading=leading):
+            return entries[0]
+        return None
+
+    def get(self, *names: str) -> str | None:
+        """Return the content of the first tag with any of the given names."""
+        if (entry := self.first(names)) is not None:
+            return entry[1]
+        return None
+
+
+def add_entry(
+    contents: Contents, key: str, entry: tuple[int, str, bool, bool]
+) -> None:
+    if (entries := contents.get(key)) is None:
+        contents[key] = [entry]
+    else:
+        entries.append(entry)
+
+
+def regex_meta_index(html: str) -> MetaIndex:
+    """Index all <meta> tags of html using regular expressions.
+
+    Contents are kept raw, i.e. not unescaped.
+    """
+    contents: Contents = {}
+    for tag in META_TAG_FINDITER(html):
+        # name -> (exact, index of the attribute)
+        keys: dict[str, tuple[bool, int]] = {}
+        content = None
+        for i, m in enumerate(ATTR_FINDITER(tag['attrs'])):
+            attr = m['attr'].lower()
+            if attr == 'content':
+                if m['eq'] == '=' and (value := m['dq'] or m['sq']):
+                    content = value
+                    content_index = i
+            elif attr == 'name' or attr == 'property':
+                if value := m['dq'] or m['sq'] or m['uq']:
+                    exact = m['eq'] == '=' and m['uq'] is None
+                    key = value.lower()
+                    if key not in keys or (exact and not keys[key][0]):
+                        keys[key] = exact, i
+        if content is None:
+            continue
+        start = tag.start()
+        for key, (exact, i) in keys.items():
+            leading = exact and i + content_index == 1
+            add_entry(contents, key, (start, content, exact, leading))
+    return MetaIndex(contents)
+
+
+def lxml_meta_index(html: str) -> MetaIndex:
+    """Index the <meta> tags in the head of html using lxml.
+
+    Contents are unescaped by the parser. Attribute quoting is not visible
+    to it, so all names are exact. The position of a tag is approximated
+    by the start of its line.
+    """
+    contents: Contents = {}
+    parser = HTMLPullParser(events=('end',), tag=('head', 'meta'))
+    line_starts = [0]
+    # the current line and the number of meta tags seen on it
+    line = on_line = 0
+
+    def index_events() -> bool:
+        """Index the parsed meta tags; return True at the end of head."""
+        nonlocal line, on_line
+        for _, element in parser.read_events():
+            if element.tag == 'head':
+                return True
+            attrib = element.attrib
+            if not (content := attrib.get('content')):
+                continue
+            if (sourceline := element.sourceline or line) > line:
+                while len(line_starts) < sourceline:
+                    if (i := html.find('\n', line_starts[-1])) == -1:
+                        break
+                    line_starts.append(i + 1)
+                line = sourceline
+                on_line = 0
+            # keep tags on the same line distinct and in order
+            start = line_starts[min(line, len(line_starts)) - 1] + on_line
+            on_line += 1
+            keys: dict[str, int] = {}
+            content_index = 0
+            for i, attr in enumerate(attrib):
+                if attr == 'content':
+                    content_index = i
+                elif (attr == 'name' or attr == 'property') and (
+                    value := attrib[attr]
+                ):
+                    keys.setdefault(value.lower(), i)
+            for key, i in keys.items():
+                leading = i + content_index == 1
+                add_entry(contents, key, (start, content, True, leading))
+        return False
+
+    for i in range(0, len(html), LXML_CHUNK_SIZE):
+        parser.feed(html[i : i + LXML_CHUNK_SIZE])
+        if index_events():
+            return MetaIndex(contents)
+    if html:
+        parser.close()
+        index_events()
+    return MetaIndex(contents)
+
+
+ENGINES: dict[str, Callable[[str], MetaIndex]] = {
+    'regex': regex_meta_index,
+    'lxml': lxml_meta_index,
+}
+meta_index = ENGINES[EXTRACTION_ENGINE]
@@ -1,5 +1,5 @@
 import atexit
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
 from functools import partial
 from hashlib import sha1
 from json import dump, load, loads
@@ -64,6 +64,10 @@ class FakeResponse:
     def iter_content(self):
         yield self.content
 
+    async def aiter_content(self):
+        for chunk in self.iter_content():
+            yield chunk
+
     def raise_for_status(self):
         if (self.status_code // 100) != 2:
             raise CurlError('status code was not 2xx')
@@ -164,6 +168,16 @@ def fake_request(
     return response
 
 
+async def fake_async_request(url, **kwargs):
+    return fake_request(url, **kwargs)
+
+
+@asynccontextmanager
+async def fake_async_stream(url, **kwargs):
+    with fake_request(url, stream=True, **kwargs) as response:
+        yield response
+
+
 @contextmanager
 def real_request():
     lib.request = original_request
@@ -173,6 +187,8 @@ def real_request():
 
 original_request = lib.request
 lib.request = fake_request
+lib.async_request = fake_async_request
+lib.async_stream = fake_async_stream
 
 # this import needs to placed after Session patch
 from lib.pubmed import NCBI_URL  # noqa
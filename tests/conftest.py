@@ -13,7 +13,8 @@ PRINT_TEST_FILENAME = config('PRINT_TEST_FILENAME', False, cast=bool)
 
 
 if READONLY_TESTDATA:
-    disable_socket()
+    # asyncio event loops wake themselves up through a unix socket pair
+    disable_socket(allow_unix_socket=True)
     from curl_cffi import requests
 
     requests.Response = requests.Session = NotImplementedError(
@@ -1,13 +1,29 @@
+import asyncio
+from asyncio import get_running_loop
+from gc import collect
+from gzip import decompress
 from io import BytesIO
-from json import JSONDecodeError
+from json import JSONDecodeError, dumps, loads
+from os import getpid
+from time import perf_counter, sleep
 from unittest.mock import Mock, patch
 from urllib.parse import urlparse
 
 # noinspection PyPackageRequirements
 from curl_cffi import CurlError
-from pytest import raises
+from pytest import mark, raises
 
 from app import (
+    BATCH_MAX_ITEMS,
+    ReturnError,
+    app,
+    asgi_app,
+    async_cached_data,
+    async_resolvers,
+    async_url_doi_isbn_data,
+    cached_data,
+    cached_resolvers,
+    get_handler,
     get_resolver,
     google_books_data,
     google_encrypted_data,
@@ -15,9 +31,12 @@ from app import (
     logger,
     noorlib_data,
     noormags_data,
+    resolver_cache,
     root,
     url_doi_isbn_data,
 )
+from lib import time_is_short
+from lib.deadline import Deadline, deadline_scope
 
 
 def fake_resolver(*_):
@@ -163,3 +182,428 @@ def test_http_error_in_fetching_doi(mock_url_data, mock_doi_data):
     mock_doi_data.assert_called_once_with('10.5555/1105634.1105641', True)
     mock_url_data.assert_called_once_with(user_input)
     assert result is NotImplemented
+
+
+def run_asgi(scope: dict, body: bytes = b'') -> list[dict]:
+    messages = [{'type': 'http.request', 'body': body}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi_app(scope, receive, send))
+    return sent
+
+
+def asgi_scope(path: str, method='GET', headers=()) -> dict:
+    return {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': b'',
+        'headers': [*headers],
+    }
+
+
+def test_asgi_page_does_not_exist():
+    start, body, end = run_asgi(asgi_scope('/no-such-page'))
+    assert start['status'] == 404
+    assert body['body'] == b'404 not found'
+    assert end == {'type': 'http.response.body', 'body': b''}
+
+
+def test_asgi_json_body():
+    m = Mock(side_effect=NotImplementedError)
+    with (
+        patch.dict(input_type_to_resolver, {'url-doi-isbn': m}),
+        patch.object(logger, 'exception'),
+    ):
+        start, body, _ = run_asgi(
+            asgi_scope(
+                '/',
+                'POST',
+                [
+                    (
+                        b'x-gateway-validation',
+                        b'CITER_IS_NOT_INTENDED_FOR_BOTS',
+                    )
+                ],
+            ),
+            b'{"user_input": "10.1038/nrd842", "input_type": "url-doi-isbn"}',
+        )
+    m.assert_called_once_with('10.1038/nrd842')
+    assert start['status'] == 500
+    assert (b'content-type', b'application/json') in start['headers']
+    assert loads(body['body']) == ['NotImplementedError', '', '']
+
+
+VALIDATION_HEADER = (
+    b'x-gateway-validation',
+    b'CITER_IS_NOT_INTENDED_FOR_BOTS',
+)
+
+
+def test_asgi_resolves_dois_on_the_event_loop():
+    with (
+        patch('app.run_blocking', side_effect=AssertionError),
+        patch('app.send_wsgi_response', side_effect=AssertionError),
+    ):
+        start, body, *_ = run_asgi(
+            asgi_scope('/', 'POST', [VALIDATION_HEADER]),
+            b'{"user_input": "10.1038/nrd842", "input_type": "url-doi-isbn"}',
+        )
+    resolver_cache.clear()
+    assert start['status'] == 200
+    assert 'title=Selective anticancer drugs' in loads(body['body'])[1]
+
+
+def test_asgi_aborts_when_the_client_disconnects():
+    sent = []
+
+    async def receive():
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    with patch('app.app') as app_mock:
+        asyncio.run(asgi_app(asgi_scope('/', 'POST'), receive, send))
+    app_mock.assert_not_called()
+    assert sent == []
+
+
+def test_asgi_joins_repeated_headers_and_supports_write():
+    def handler(start_response, environ):
+        write = start_response('200 OK', [])
+        write(environ['HTTP_ACCEPT'].encode())
+        return (b'!',)
+
+    with patch.dict(get_handler.__self__, {'/write': handler}):
+        start, *bodies = run_asgi(
+            asgi_scope(
+                '/write', headers=[(b'accept', b'a'), (b'accept', b'b')]
+            )
+        )
+    assert [b['body'] for b in bodies] == [b'a,b', b'!', b'']
+
+
+def test_batch():
+    def slow_resolver(user_input):
+        sleep(0.2)
+        if user_input == 'bad':
+            raise ReturnError('bad input', '', '')
+        return {'cite_type': 'web', 'title': user_input}
+
+    body = dumps(
+        {
+            'input_type': 'batch',
+            'user_input': [
+                {'input_type': 'pmid', 'user_input': 'a'},
+                {'input_type': 'pmid', 'user_input': 'bad'},
+                {'input_type': 'unknown', 'user_input': 'c'},
+                {'input_type': 'pmid', 'user_input': 'd'},
+            ],
+        }
+    ).encode()
+    start_response = Mock()
+    t0 = perf_counter()
+    with patch.dict(input_type_to_resolver, {'pmid': slow_resolver}):
+        (response_body,) = root(
+            start_response,
+            {'CONTENT_LENGTH': str(len(body)), 'wsgi.input': BytesIO(body)},
+        )
+    assert perf_counter() - t0 < 0.6  # items are resolved concurrently
+    start_response.assert_called_once()
+    scrs = loads(response_body)
+    assert len(scrs) == 4
+    assert 'title=a' in scrs[0][1]
+    assert scrs[1] == ['bad input', '', '']
+    assert scrs[2] == ['Error: invalid input_type', '', '']
+    assert 'title=d' in scrs[3][1]
+
+
+def batch_response(items) -> tuple[Mock, bytes]:
+    body = dumps({'input_type': 'batch', 'user_input': items}).encode()
+    start_response = Mock()
+    (response_body,) = root(
+        start_response,
+        {'CONTENT_LENGTH': str(len(body)), 'wsgi.input': BytesIO(body)},
+    )
+    return start_response, response_body
+
+
+def test_empty_batch():
+    start_response, response_body = batch_response([])
+    assert start_response.call_args[0][0] == '200 OK'
+    assert loads(response_body) == []
+
+
+@mark.parametrize(
+    'items',
+    [
+        [{'input_type': 'pmid', 'user_input': '1'}] * (BATCH_MAX_ITEMS + 1),
+        ['1'],
+        [{'input_type': 'pmid', 'user_input': ''}],
+        'not a list',
+    ],
+)
+def test_invalid_batch(items):
+    start_response, response_body = batch_response(items)
+    assert start_response.call_args[0][0] == '400 Bad Request'
+    assert loads(response_body)[0].startswith('Error: ')
+
+
+def test_ndjson_batch_yields_finished_items_first():
+    def resolver(user_input):
+        sleep(float(user_input))
+        return {'cite_type': 'web', 'title': user_input}
+
+    body = dumps(
+        {
+            'input_type': 'batch',
+            'user_input': [
+                {'input_type': 'pmid', 'user_input': '0.4'},
+                {'input_type': 'pmid', 'user_input': '0'},
+            ],
+        }
+    ).encode()
+    start_response = Mock()
+    with patch.dict(input_type_to_resolver, {'pmid': resolver}):
+        lines = [
+            *root(
+                start_response,
+                {
+                    'CONTENT_LENGTH': str(len(body)),
+                    'wsgi.input': BytesIO(body),
+                    'HTTP_ACCEPT': 'application/x-ndjson',
+                },
+            )
+        ]
+    assert start_response.call_args[0][0] == '200 OK'
+    assert [loads(line)[:2] for line in lines] == [[1, 200], [0, 200]]
+    assert all(line.endswith(b'\n') for line in lines)
+    assert 'title=0.4' in loads(lines[1])[3]
+
+
+def test_ndjson_single_input_has_its_real_status():
+    def resolver(user_input):
+        raise ReturnError('bad input', '', '')
+
+    body = dumps({'input_type': 'pmid', 'user_input': 'bad'}).encode()
+    start_response = Mock()
+    with patch.dict(input_type_to_resolver, {'pmid': resolver}):
+        (line,) = root(
+            start_response,
+            {
+                'CONTENT_LENGTH': str(len(body)),
+                'wsgi.input': BytesIO(body),
+                'HTTP_ACCEPT': 'application/x-ndjson',
+            },
+        )
+    assert start_response.call_args[0][0][:3] == '500'
+    assert loads(line) == [0, 500, 'bad input', '', '']
+
+
+def test_resolver_cache_ignores_output_format():
+    calls = []
+
+    def resolver(user_input):
+        calls.append(user_input)
+        return {'cite_type': 'web', 'title': 'T', 'isbn': '9780201633610'}
+
+    def post(pipe_format):
+        body = dumps(
+            {
+                'input_type': 'pmid',
+                'user_input': '۱۲۳',
+                'pipeformat': pipe_format,
+            }
+        ).encode()
+        return loads(
+            root(
+                fake_start_response,
+                {
+                    'CONTENT_LENGTH': str(len(body)),
+                    'wsgi.input': BytesIO(body),
+                },
+            )[0]
+        )[1]
+
+    with (
+        patch.dict(input_type_to_resolver, {'pmid': resolver}),
+        patch.dict(cached_resolvers, {resolver: (60, str)}),
+    ):
+        cit1 = post(' | ')
+        cit2 = post('|')
+    resolver_cache.clear()
+    assert calls == ['۱۲۳']
+    assert 'isbn=978-0-201-63361-0' in cit1
+    assert '|isbn=978-0-201-63361-0' in cit2
+
+
+def test_results_missing_enrichments_are_not_cached():
+    calls = []
+
+    def resolver(user_input):
+        calls.append(user_input)
+        time_is_short('home page')
+        return {'cite_type': 'web', 'title': 'T'}
+
+    with (
+        patch.dict(cached_resolvers, {resolver: (60, str)}),
+        deadline_scope(Deadline(1)),
+    ):
+        cached_data(resolver, 'a')
+        cached_data(resolver, 'a')
+        asyncio.run(async_cached_data_of(resolver, 'a'))
+    resolver_cache.clear()
+    assert calls == ['a', 'a', 'a']
+
+
+async def async_cached_data_of(data_func, user_input):
+    async def async_func(user_input):
+        return data_func(user_input)
+
+    with patch.dict(async_resolvers, {data_func: async_func}):
+        return await async_cached_data(data_func, user_input)
+
+
+def test_doi_and_url_paths_run_concurrently():
+    def doi_data(*_):
+        sleep(0.3)
+        raise CurlError('doi failed')
+
+    def url_data(_):
+        sleep(0.3)
+        return NotImplemented
+
+    user_input = 'https://dl.acm.org/doi/10.5555/3157382.3157535'
+    t0 = perf_counter()
+    with (
+        patch('app.doi_data', doi_data),
+        patch('app.url_data', url_data),
+    ):
+        assert url_doi_isbn_data(user_input) is NotImplemented
+    assert perf_counter() - t0 < 0.5
+
+
+@patch('app.url_data', side_effect=NotImplementedError)
+@patch('app.doi_data', side_effect=CurlError('Test curl error'))
+def test_url_error_is_raised_after_doi_failure(_, __):
+    with raises(NotImplementedError):
+        url_doi_isbn_data('https://dl.acm.org/doi/10.5555/3157382.3157535')
+
+
+def test_failure_of_the_losing_url_task_is_retrieved():
+    errors = []
+
+    async def url_data(_):
+        try:
+            await asyncio.sleep(1)
+        finally:
+            raise NotImplementedError  # e.g. while closing a response
+
+    async def doi_data(*_):
+        await asyncio.sleep(0)
+        return {}
+
+    async def main():
+        get_running_loop().set_exception_handler(
+            lambda _, context: errors.append(context)
+        )
+        result = await async_url_doi_isbn_data(
+            'https://dl.acm.org/doi/10.5555/3157382.3157535'
+        )
+        await asyncio.sleep(0)  # let the cancelled task finish
+        collect()  # the task is destroyed and logged if not retrieved
+        return result
+
+    with (
+        patch('app.async_url_data', url_data),
+        patch('app.async_doi_data', doi_data),
+    ):
+        assert asyncio.run(main()) == {}
+    assert errors == []
+
+
+def test_metrics():
+    with (
+        patch.dict(input_type_to_resolver, {'pmid': fake_resolver}),
+        patch.object(logger, 'exception'),
+    ):
+        root(
+            fake_start_response,
+            {
+                'CONTENT_LENGTH': '41',
+                'wsgi.input': BytesIO(
+                    b'{"input_type": "pmid", "user_input": "1"}'
+                ),
+            },
+        )
+    start_response = Mock()
+    (body,) = app({'PATH_INFO': '/metrics'}, start_response)
+    assert start_response.call_args[0][0] == '200 OK'
+    text = body.decode()
+    worker = f'worker="{getpid()}"'
+    assert (
+        f'citer_requests_total{{{worker},input_type="pmid",status="500"}}'
+        in text
+    )
+    assert (
+        f'citer_request_duration_seconds_count{{{worker},input_type="pmid"}}'
+        in text
+    )
+    assert '# TYPE citer_upstream_errors_total counter\n' in text
+
+
+def shell_environ(**environ) -> dict:
+    return {'wsgi.input': BytesIO(), 'QUERY_STRING': ''} | environ
+
+
+def test_shell_is_precompressed_and_revalidated():
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'QUERY_STRING': 'input_type=pmid&user_input=123',
+        'HTTP_ACCEPT_ENCODING': 'br;q=0, gzip',
+    }
+    start_response = Mock()
+    (body,) = root(start_response, shell_environ(**environ))
+    status, headers = start_response.call_args[0]
+    assert status == '200 OK'
+    headers = dict(headers)
+    assert headers['Content-Encoding'] == 'gzip'
+    assert headers['Vary'] == 'Accept-Encoding'
+    assert '="pmid" selected' in decompress(body).decode()
+
+    # the ETag of the selected variant validates
+    (body,) = root(
+        start_response,
+        shell_environ(
+            QUERY_STRING='input_type=pmid',
+            HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=headers['ETag'],
+        ),
+    )
+    assert start_response.call_args[0][0] == '304 Not Modified'
+    assert dict(start_response.call_args[0][1])['ETag'] == headers['ETag']
+    assert body == b''
+
+    # that of another coding does not
+    (body,) = root(
+        start_response,
+        shell_environ(
+            QUERY_STRING='input_type=pmid',
+            HTTP_IF_NONE_MATCH=headers['ETag'],
+        ),
+    )
+    assert start_response.call_args[0][0] == '200 OK'
+    assert b'="pmid" selected' in body
+
+    # unknown combinations are still rendered
+    (body,) = root(start_response, shell_environ(QUERY_STRING='pipeformat=x'))
+    assert start_response.call_args[0][0] == '200 OK'
+    assert 'ETag' not in dict(start_response.call_args[0][1])
+    assert b'<html' in body
@@ -0,0 +1,15 @@
+import asyncio
+from threading import current_thread
+from unittest.mock import patch
+
+from lib.blocking import run_store_io
+
+
+def thread_name() -> str:
+    return current_thread().name
+
+
+def test_store_io_leaves_the_loop_only_for_sqlite():
+    assert asyncio.run(run_store_io(thread_name)) == 'MainThread'
+    with patch('lib.blocking.CACHE_PATH', 'cache.sqlite'):
+        assert asyncio.run(run_store_io(thread_name)).startswith('asgi')
@@ -0,0 +1,54 @@
+from time import time
+from unittest.mock import patch
+
+from lib.cache import LRUCache, SQLiteCache
+
+
+def test_lru_eviction():
+    cache = LRUCache(2)
+    cache.set('a', 1, 60)
+    cache.set('b', 2, 60)
+    assert cache.get('a') == 1  # 'b' is now the least recently used
+    cache.set('c', 3, 60)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_expired_entries_are_misses():
+    cache = LRUCache(2)
+    with patch('lib.cache.time', return_value=0):
+        cache.set('a', 1, 10)
+    with patch('lib.cache.time', return_value=11):
+        assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_get_returns_a_copy():
+    cache = LRUCache(1)
+    cache.set('a', {'title': 'x'}, 60)
+    cache.get('a')['title'] = 'y'
+    assert cache.get('a') == {'title': 'x'}
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = f'{tmp_path}/cache.sqlite3'
+    SQLiteCache(path, 10_000, 'a').set('k', {'title': 'x'}, 60)
+    cache = SQLiteCache(path, 10_000, 'a')
+    assert cache.get('k') == {'title': 'x'}
+    assert SQLiteCache(path, 10_000, 'b').get('k') is None  # other namespace
+    with patch('lib.cache.time', return_value=time() + 61):
+        assert cache.get('k') is None
+
+
+def test_sqlite_cache_byte_cap(tmp_path):
+    cache = SQLiteCache(f'{tmp_path}/cache.sqlite3', 10_000, 'a')
+    cache.EVICTION_INTERVAL = 1
+    for i in range(20):
+        with patch('lib.cache.time', return_value=i):
+            cache.set(str(i), b'x' * 1000, 60)
+    assert 0 < len(cache) < 10
+    with patch('lib.cache.time', return_value=20):
+        assert cache.get('19') == b'x' * 1000  # recently used ones are kept
+        assert cache.get('0') is None
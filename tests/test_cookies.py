@@ -0,0 +1,75 @@
+from http.cookiejar import Cookie
+
+from lib.cookies import BoundedCookieJar
+
+
+def cookie(domain: str, name: str, path='/') -> Cookie:
+    return Cookie(
+        0, name, 'v', None, False, domain, True, domain[0] == '.',
+        path, False, False, None, False, None, None, {},
+    )  # fmt: skip
+
+
+def names(jar: BoundedCookieJar) -> set[tuple[str, str]]:
+    return {(c.domain, c.name) for c in jar}
+
+
+def test_one_off_hosts_are_dropped():
+    jar = BoundedCookieJar(10, 10, keep_one_off=False)
+    jar.note_request('https://once.example.com/a')
+    jar.set_cookie(cookie('once.example.com', 'a'))
+    assert not names(jar)
+    jar.note_request('https://once.example.com/b')
+    jar.set_cookie(cookie('once.example.com', 'b'))
+    # parent domains are counted too
+    jar.set_cookie(cookie('.example.com', 'c'))
+    assert names(jar) == {('once.example.com', 'b'), ('.example.com', 'c')}
+
+
+def test_per_domain_cap_drops_oldest():
+    jar = BoundedCookieJar(2, 10)
+    jar.set_cookie(cookie('a.org', '1'))
+    jar.set_cookie(cookie('a.org', '2', '/x'))
+    jar.set_cookie(cookie('a.org', '3'))
+    assert names(jar) == {('a.org', '2'), ('a.org', '3')}
+
+
+def test_least_recently_updated_domain_is_dropped():
+    jar = BoundedCookieJar(10, 2)
+    jar.set_cookie(cookie('a.org', '1'))
+    jar.set_cookie(cookie('b.org', '1'))
+    jar.set_cookie(cookie('a.org', '2'))
+    jar.set_cookie(cookie('c.org', '1'))
+    assert names(jar) == {('a.org', '1'), ('a.org', '2'), ('c.org', '1')}
+    assert jar.stats() == {'domains': 2, 'cookies': 3}
+
+
+def test_requested_domains_are_recently_used():
+    jar = BoundedCookieJar(10, 2)
+    jar.set_cookie(cookie('.a.org', '1'))
+    jar.set_cookie(cookie('b.org', '1'))
+    jar.note_request('https://www.a.org/')
+    jar.set_cookie(cookie('c.org', '1'))
+    assert names(jar) == {('.a.org', '1'), ('c.org', '1')}
+
+
+def test_cleared_domains_are_forgotten():
+    jar = BoundedCookieJar(10, 10)
+    expired = cookie('a.org', '1')
+    expired.expires = 1
+    jar.set_cookie(expired)
+    jar.set_cookie(cookie('b.org', '1'))
+    jar.set_cookie(cookie('b.org', '2'))
+    jar.clear_expired_cookies()
+    jar.clear('b.org', '/', '1')
+    assert jar._domains == {'b.org': None}
+    jar.clear('b.org', '/', '2')
+    assert not jar._domains
+    assert jar.stats() == {'domains': 0, 'cookies': 0}
+
+
+def test_one_off_hosts_are_kept_by_default():
+    jar = BoundedCookieJar(10, 10)
+    jar.note_request('https://once.example.com/a')
+    jar.set_cookie(cookie('once.example.com', 'a'))
+    assert names(jar) == {('once.example.com', 'a')}
@@ -0,0 +1,79 @@
+from unittest.mock import Mock, patch
+
+from curl_cffi.requests.headers import Headers
+from curl_cffi.requests.models import Response
+
+from lib.cache import LRUCache
+from lib.httpcache import cache_control, cached_get, freshness_lifetime
+
+
+def response(status_code=200, content=b'x', **headers) -> Response:
+    r = Response()
+    r.url = 'https://api.example.org/a'
+    r.status_code = status_code
+    r.headers = Headers({k.replace('_', '-'): v for k, v in headers.items()})
+    r.content = content
+    return r
+
+
+def lifetime(**headers) -> float:
+    r = response(**headers)
+    return freshness_lifetime(r.url, r.headers, cache_control(r.headers))
+
+
+def test_freshness_lifetime():
+    assert lifetime(cache_control='max-age=60') == 60
+    assert lifetime(cache_control='max-age=60, s-maxage=10') == 10
+    assert lifetime(cache_control='no-cache, max-age=60') == 0
+    assert (
+        lifetime(
+            expires='Thu, 01 Jan 2026 00:01:00 GMT',
+            date='Thu, 01 Jan 2026 00:00:00 GMT',
+        )
+        == 60
+    )
+    assert lifetime(expires='0') == 0
+    assert lifetime() == 0
+    with patch.dict('lib.httpcache.HOST_TTLS', {'api.example.org': 5}):
+        assert lifetime() == 5
+
+
+def cached(fetch: Mock) -> Response:
+    return cached_get('https://api.example.org/a', {'A': 'b'}, fetch)
+
+
+@patch('lib.httpcache.store', LRUCache(10))
+def test_fresh_responses_are_served_from_cache():
+    fetch = Mock(return_value=response(cache_control='max-age=60'))
+    cached(fetch)
+    r = cached(fetch)
+    fetch.assert_called_once_with({'A': 'b'})
+    assert r.content == b'x'
+    assert r.headers['cache-control'] == 'max-age=60'
+
+
+@patch('lib.httpcache.store', LRUCache(10))
+def test_uncacheable_responses():
+    for headers in (
+        {'cache_control': 'no-store, max-age=60'},
+        {'cache_control': 'private, max-age=60'},
+        {'cache_control': 'max-age=60', 'vary': '*'},
+        {},
+    ):
+        fetch = Mock(return_value=response(**headers))
+        cached(fetch)
+        cached(fetch)
+        assert fetch.call_count == 2
+
+
+@patch('lib.httpcache.store', LRUCache(10))
+def test_stale_responses_are_revalidated():
+    fetch = Mock(return_value=response(cache_control='no-cache', etag='"v1"'))
+    cached(fetch)
+    fetch.return_value = response(304, b'', etag='"v1"', x_new='1')
+    r = cached(fetch)
+    fetch.assert_called_with({'A': 'b', 'If-None-Match': '"v1"'})
+    assert r.status_code == 200
+    assert r.content == b'x'
+    assert r.headers['x-new'] == '1'
+    assert r.headers['cache-control'] == 'no-cache'
@@ -0,0 +1,86 @@
+from unittest.mock import patch
+
+from curl_cffi import CurlError
+from pytest import raises
+
+from lib.metrics import (
+    UPSTREAM_ERRORS,
+    Counter,
+    Histogram,
+    Metric,
+    caches,
+    registry,
+    render,
+    upstream_label,
+)
+from tests import original_request
+
+
+def test_counter_and_histogram_samples():
+    c = Counter('c_total', 'help', ('a',))
+    h = Histogram('h_seconds', 'help', ('a',), (0.1, 1))
+    registry.remove(c)
+    registry.remove(h)
+    c.inc('x')
+    c.inc('x', amount=2)
+    c.inc('y"')
+    h.observe(0.05, 'x')
+    h.observe(0.5, 'x')
+    h.observe(5, 'x')
+    with patch('lib.metrics.getpid', return_value=7):
+        c_samples = c.samples()
+        h_samples = h.samples()
+    assert c_samples == [
+        'c_total{worker="7",a="x"} 3',
+        'c_total{worker="7",a="y\\""} 1',
+    ]
+    assert h_samples == [
+        'h_seconds_bucket{worker="7",a="x",le="0.1"} 1',
+        'h_seconds_bucket{worker="7",a="x",le="1"} 2',
+        'h_seconds_bucket{worker="7",a="x",le="+Inf"} 3',
+        'h_seconds_count{worker="7",a="x"} 3',
+        'h_seconds_sum{worker="7",a="x"} 5.55',
+    ]
+
+
+def test_metrics_must_define_samples():
+    class NoSamples(Metric):
+        type = 'gauge'
+
+    with raises(TypeError):
+        NoSamples('g', 'help', ())
+
+
+def test_upstream_label():
+    assert upstream_label('https://api.crossref.org/works/x') == (
+        'api.crossref.org'
+    )
+    assert upstream_label('https://example.com/') == 'other'
+
+
+def test_cache_hit_ratio():
+    class Cache:
+        hits = 3
+        misses = 1
+
+    with (
+        patch.dict(caches, {'test': Cache}),
+        patch('lib.metrics.getpid', return_value=7),
+    ):
+        text = render()
+    assert 'citer_cache_hit_ratio{worker="7",cache="test"} 0.75\n' in text
+    assert 'citer_cache_misses{worker="7",cache="test"} 1\n' in text
+
+
+def test_upstream_errors_are_counted():
+    key = ('doi.org', 'CurlError')
+    before = UPSTREAM_ERRORS.values.get(key, 0)
+    with (
+        patch('lib.pooled_session') as pooled_session,
+        raises(CurlError),
+    ):
+        pooled_session.return_value.__enter__.return_value.request.side_effect = CurlError(
+            ''
+        )
+        original_request('https://doi.org/10.1/x')
+    assert UPSTREAM_ERRORS.values[key] == before + 1
@@ -0,0 +1,65 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock, patch
+
+from curl_cffi import CurlError
+
+from lib.prewarm import (
+    async_warm_up,
+    keep_warm,
+    start_async_prewarming,
+    stop_event,
+    warm_up,
+)
+from lib.sessions import SessionPool
+
+
+def test_warm_up_uses_distinct_sessions():
+    pool = SessionPool(Mock, 10)
+    with patch('lib.prewarm.session_pool', pool):
+        warm_up(['https://a.org/', 'https://b.org/'])
+    assert pool.stats()['created'] == 4
+    for session in pool._idle:
+        assert [c.args[:2] for c in session.request.call_args_list] == [
+            ('HEAD', 'https://a.org/'),
+            ('HEAD', 'https://b.org/'),
+        ]
+
+
+def test_keep_warm_survives_errors_and_stops():
+    session = Mock()
+    session.request.side_effect = CurlError('')
+    pool = SessionPool(lambda: session, 10)
+    stop_event.set()
+    with patch('lib.prewarm.session_pool', pool):
+        keep_warm(['https://a.org/'])
+    stop_event.clear()
+    assert session.request.call_count == 4
+
+
+def test_async_warm_up_opens_concurrent_connections():
+    session = Mock(request=AsyncMock(side_effect=[None, CurlError('')] * 4))
+    with patch('lib.prewarm.async_session', return_value=session):
+        asyncio.run(async_warm_up(['https://a.org/', 'https://b.org/']))
+    assert [c.args[:2] for c in session.request.call_args_list] == [
+        ('HEAD', 'https://a.org/')
+    ] * 4 + [('HEAD', 'https://b.org/')] * 4
+
+
+def test_async_prewarming_keeps_running_until_cancelled():
+    async def main():
+        task = start_async_prewarming()
+        while session.request.call_count <= 4:  # a second round has begun
+            await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.sleep(0)
+        return task
+
+    session = Mock(request=AsyncMock())
+    with (
+        patch('lib.prewarm.async_session', return_value=session),
+        patch('lib.prewarm.PREWARM_URLS', ('https://a.org/',)),
+        patch('lib.prewarm.KEEPALIVE_INTERVAL', 0),
+    ):
+        task = asyncio.run(main())
+    assert task.cancelled()
+    assert session.request.call_count > 4
@@ -0,0 +1,57 @@
+from unittest.mock import patch
+
+from pytest import raises
+
+from lib import Thread, budgeted_timeout, open_access_url, time_is_short
+from lib.deadline import (
+    Deadline,
+    DeadlineExceeded,
+    deadline_scope,
+    remaining_time,
+    skipped_enrichments,
+)
+from tests import original_request
+
+
+def test_timeout_is_limited_by_deadline():
+    assert budgeted_timeout('u', 15.0) == 15.0  # no deadline
+    with deadline_scope(Deadline(5)):
+        assert 4 < budgeted_timeout('u', 15.0) <= 5
+        assert budgeted_timeout('u', 3.0) == 3.0
+    with deadline_scope(Deadline(0)), raises(DeadlineExceeded):
+        budgeted_timeout('u', 15.0)
+
+
+def test_request_fails_fast_after_deadline():
+    with (
+        deadline_scope(Deadline(0)),
+        patch('lib.pooled_session') as pooled_session,
+        raises(DeadlineExceeded),
+    ):
+        original_request('https://example.com/')
+    pooled_session.assert_not_called()
+
+
+def test_deadline_propagates_to_threads():
+    result = []
+
+    def target():
+        result.append(remaining_time())
+
+    with deadline_scope(Deadline(5)):
+        thread = Thread(target=target)
+        thread.start()
+        thread.join()
+    assert 4 < result[0] <= 5
+
+
+def test_enrichments_are_skipped_when_time_is_short():
+    with skipped_enrichments() as skipped:
+        assert time_is_short('x') is False
+        with deadline_scope(Deadline(1)):
+            assert time_is_short('x') is True
+            assert open_access_url('10.1000/182') is None
+            thread = Thread(target=time_is_short, args=('y',))
+            thread.start()
+            thread.join()
+    assert skipped == ['x', 'open access url', 'y']
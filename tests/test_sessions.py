@@ -0,0 +1,56 @@
+from threading import Thread
+from unittest.mock import Mock
+
+from pytest import raises
+
+from lib.sessions import SessionPool
+
+
+def test_sessions_are_reused_lifo():
+    pool = SessionPool(Mock, 1)
+    with pool.session() as s1:
+        with pool.session() as s2:
+            assert s1 is not s2
+            assert pool.stats()['in_use'] == 2
+        with pool.session() as s3:
+            assert s3 is s2
+    # max_idle is 1, so the second returned session is closed
+    s1.close.assert_called_once()
+    s2.close.assert_not_called()
+    assert pool.stats() == {
+        'created': 2,
+        'checkouts': 3,
+        'in_use': 0,
+        'idle': 1,
+        'closed': 1,
+    }
+
+
+def test_session_is_returned_on_error():
+    pool = SessionPool(Mock, 2)
+    with raises(ValueError), pool.session():
+        raise ValueError
+    assert pool.stats()['idle'] == 1
+    assert pool.stats()['in_use'] == 0
+
+
+def test_a_session_is_not_shared_between_threads():
+    pool = SessionPool(object, 10)
+    in_use = set()
+    errors = []
+
+    def target():
+        for _ in range(100):
+            with pool.session() as s:
+                if id(s) in in_use:
+                    errors.append(s)
+                in_use.add(id(s))
+                in_use.discard(id(s))
+
+    threads = [Thread(target=target) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert pool.stats()['checkouts'] == 500
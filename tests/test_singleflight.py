@@ -0,0 +1,124 @@
+import asyncio
+from copy import deepcopy
+from threading import Event, Thread
+from time import sleep
+
+from pytest import raises
+
+from lib.deadline import Deadline, DeadlineExceeded, deadline_scope
+from lib.singleflight import SingleFlight
+
+
+def run_concurrently(flight: SingleFlight, func, n: int) -> tuple:
+    results = []
+
+    def target():
+        try:
+            results.append(flight.do('key', func))
+        except Exception as e:
+            results.append(e)
+
+    threads = [Thread(target=target) for _ in range(n)]
+    for t in threads:
+        t.start()
+    return threads, results
+
+
+def test_concurrent_calls_are_coalesced():
+    release = Event()
+    calls = []
+
+    def func():
+        calls.append(1)
+        release.wait()
+        return {'title': 'T'}
+
+    flight = SingleFlight(deepcopy)
+    threads, results = run_concurrently(flight, func, 5)
+    while flight.coalesced < 4:
+        sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert results == [{'title': 'T'}] * 5
+    # each caller got its own copy
+    assert len({id(r) for r in results}) == 5
+
+
+def test_errors_are_shared():
+    release = Event()
+
+    def func():
+        release.wait()
+        raise ValueError('upstream failed')
+
+    flight = SingleFlight()
+    threads, results = run_concurrently(flight, func, 3)
+    while flight.coalesced < 2:
+        sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join()
+    assert all(type(r) is ValueError for r in results)
+    # the key is released after the call has finished
+    with raises(ValueError):
+        flight.do('key', func)
+
+
+def test_waiters_give_up_at_their_deadline():
+    release = Event()
+    flight = SingleFlight()
+    threads, results = run_concurrently(flight, release.wait, 1)
+    while not flight._calls:
+        sleep(0.01)
+    with deadline_scope(Deadline(0.05)), raises(DeadlineExceeded):
+        flight.do('key', release.wait)
+    release.set()
+    threads[0].join()
+    assert results == [True]
+
+
+def test_async_calls_are_coalesced():
+    calls = []
+
+    async def func():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {'title': 'T'}
+
+    async def main():
+        return await asyncio.gather(
+            *[flight.async_do('key', func) for _ in range(3)]
+        )
+
+    flight = SingleFlight(deepcopy)
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert flight.coalesced == 2
+    assert results == [{'title': 'T'}] * 3
+    assert len({id(r) for r in results}) == 3
+
+
+def test_async_errors_are_shared_and_cancelled_leaders_replaced():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError('upstream failed')
+
+    async def main():
+        results = await asyncio.gather(
+            *[flight.async_do('key', fail) for _ in range(2)],
+            return_exceptions=True,
+        )
+        assert all(type(r) is ValueError for r in results)
+
+        leader = asyncio.create_task(flight.async_do('key', asyncio.sleep, 1))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.async_do('key', asyncio.sleep, 0))
+        await asyncio.sleep(0)
+        leader.cancel()
+        # the waiter runs the call itself instead of sharing the cancellation
+        assert await waiter is None
+
+    flight = SingleFlight()
+    asyncio.run(main())
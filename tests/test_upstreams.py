@@ -0,0 +1,201 @@
+import asyncio
+from unittest.mock import Mock, patch
+
+from curl_cffi import CurlError
+from curl_cffi.requests.exceptions import HTTPError, Timeout
+from pytest import approx, raises
+
+from lib import (
+    CircuitOpenError,
+    RateLimitExceeded,
+    circuit,
+    record_upstream,
+    throttle,
+)
+from lib.deadline import Deadline, deadline_scope
+from lib.upstreams import (
+    CircuitBreaker,
+    LatencyTracker,
+    SQLiteTokenBucket,
+    TokenBucket,
+    new_token_bucket,
+)
+
+
+def test_token_bucket_queues_bursts():
+    with patch('lib.upstreams.monotonic', return_value=0):
+        bucket = TokenBucket(2)
+        assert bucket.reserve(1) == 0
+        assert bucket.reserve(1) == 0
+        # the bucket is empty; later callers queue behind each other
+        assert bucket.reserve(1) == approx(0.5)
+        assert bucket.reserve(1) == approx(1)
+        assert bucket.reserve(1) is None
+    with patch('lib.upstreams.monotonic', return_value=10):
+        assert bucket.reserve(0) == 0
+
+
+def test_sqlite_token_buckets_are_shared(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    with patch('lib.upstreams.time', return_value=0):
+        # one bucket per worker process
+        a = SQLiteTokenBucket(path, 'example.org', 2)
+        b = SQLiteTokenBucket(path, 'example.org', 2)
+        other = SQLiteTokenBucket(path, 'other.org', 2)
+        assert a.reserve(1) == 0
+        assert b.reserve(1) == 0
+        assert a.reserve(1) == approx(0.5)
+        assert b.reserve(1) == approx(1)
+        assert other.reserve(0) == 0
+    with patch('lib.upstreams.time', return_value=10):
+        assert b.reserve(0) == 0
+
+
+def test_rate_is_divided_between_workers():
+    with (
+        patch('lib.upstreams.CACHE_PATH', None),
+        patch('lib.upstreams.WORKERS', 4),
+    ):
+        bucket = new_token_bucket('example.org', 10)
+    assert type(bucket) is TokenBucket
+    assert bucket.rate == 2.5
+
+
+def test_throttle_respects_deadline():
+    bucket = TokenBucket(1)
+    bucket.reserve(0)
+    with (
+        patch.dict('lib.rate_limiters', {'example.org': bucket}),
+        deadline_scope(Deadline(1)),
+        patch('lib.sleep') as sleep,
+        raises(RateLimitExceeded),
+    ):
+        throttle('https://example.org/a')
+    sleep.assert_not_called()
+    with (
+        patch.dict('lib.rate_limiters', {'example.org': TokenBucket(1)}),
+        patch('lib.sleep') as sleep,
+    ):
+        throttle('https://example.org/a')
+        throttle('https://other.org/a')
+    sleep.assert_not_called()
+
+
+def test_circuit_breaker():
+    with patch('lib.upstreams.monotonic', return_value=0) as monotonic:
+        breaker = CircuitBreaker(2, 10, 15)
+        breaker.record(True)
+        breaker.record(False)  # a success resets the count
+        breaker.record(True)
+        assert breaker.allow() is True
+        breaker.record(True)
+        assert breaker.is_open
+        assert breaker.allow() is False
+
+        monotonic.return_value = 10  # half-open: only one probe
+        assert breaker.allow() is True
+        assert breaker.allow() is False
+        breaker.cancel()  # the probe said nothing; allow another one
+        assert breaker.allow() is True
+        breaker.record(True)
+        monotonic.return_value = 20  # reopened for 15 seconds
+        assert breaker.allow() is False
+        monotonic.return_value = 25
+        assert breaker.allow() is True
+        breaker.record(False)
+        assert not breaker.is_open
+        assert breaker.allow() is True
+
+
+def http_error(status_code: int) -> HTTPError:
+    return HTTPError('', 0, Mock(status_code=status_code))  # type: ignore
+
+
+def test_circuit_opens_on_upstream_failures_only():
+    breaker = CircuitBreaker(1)
+    url = 'https://example.org/'
+    with patch.dict('lib.circuit_breakers', {'example.org': breaker}):
+        with raises(HTTPError), circuit(url):
+            raise http_error(404)
+        assert not breaker.is_open
+        with raises(CurlError), circuit(url):
+            raise http_error(503)
+        assert breaker.is_open
+        with raises(CircuitOpenError), circuit(url):
+            raise AssertionError('request was not skipped')
+
+
+def test_circuit_ignores_timeouts_cut_short():
+    breaker = CircuitBreaker(1)
+    url = 'https://example.org/'
+    with patch.dict('lib.circuit_breakers', {'example.org': breaker}):
+        with raises(Timeout), circuit(url, short=True):
+            raise Timeout('')
+        assert not breaker.is_open
+        with raises(Timeout), circuit(url):
+            raise Timeout('')
+        assert breaker.is_open
+
+
+def test_cancelled_probe_does_not_close_the_circuit():
+    breaker = CircuitBreaker(1, reset_timeout=0)
+    breaker.record(True)
+    url = 'https://example.org/'
+
+    async def probe():
+        with circuit(url):
+            await asyncio.sleep(10)
+
+    async def main():
+        task = asyncio.create_task(probe())
+        await asyncio.sleep(0)
+        task.cancel()
+        with raises(asyncio.CancelledError):
+            await task
+
+    with patch.dict('lib.circuit_breakers', {'example.org': breaker}):
+        asyncio.run(main())
+    assert breaker.is_open
+    assert breaker.allow() is True  # another probe may be sent
+
+
+def test_circuit_counts_responses_slower_than_learned_timeout():
+    breaker = CircuitBreaker(1)
+    url = 'https://example.org/'
+    with (
+        patch.dict('lib.circuit_breakers', {'example.org': breaker}),
+        patch('lib.monotonic', side_effect=[0, 10, 20, 36]),
+    ):
+        with circuit(url):  # 10 seconds, under the default timeout
+            pass
+        assert not breaker.is_open
+        with circuit(url):
+            pass
+        assert breaker.is_open
+
+
+def test_timeouts_cut_short_are_not_learned():
+    url = 'https://example.org/'
+    tracker = LatencyTracker(15, 2, 30, min_samples=1)
+    with patch('lib.latencies', tracker):
+        with raises(Timeout), record_upstream(url, short=True):
+            raise Timeout('')
+        assert tracker.timeouts() == {}
+        with raises(Timeout), record_upstream(url):
+            raise Timeout('')
+        assert 'example.org' in tracker.timeouts()
+
+
+def test_latency_tracker():
+    tracker = LatencyTracker(15, 2, 30, min_samples=3, max_hosts=2)
+    tracker.observe('a', 1)
+    tracker.observe('a', 1)
+    assert tracker.timeout('a') == 15  # too few samples
+    tracker.observe('a', 4)
+    assert tracker.timeout('a') == 6  # 1.5 * p99
+    for _ in range(3):
+        tracker.observe('b', 0.1)
+    assert tracker.timeout('b') == 2  # floor
+    for _ in range(3):
+        tracker.observe('c', 100)
+    assert tracker.timeouts() == {'b': 2, 'c': 30}  # 'a' was forgotten
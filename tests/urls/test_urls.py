@@ -1,16 +1,30 @@
 # noinspection PyPackageRequirements
+import asyncio
+from threading import current_thread
+from time import monotonic
 from unittest.mock import Mock, patch
 
 from curl_cffi import CurlError
-from pytest import mark
+from pytest import mark, raises
 
 from lib.commons import data_to_sfn_cit_ref
+from lib.deadline import Deadline, DeadlineExceeded, deadline_scope
 from lib.urls import (
+    HTML_BODY_WINDOW,
+    LANG_SAMPLE_LENGTH,
     LANG_SEARCH,
+    ContentLengthError,
     ContentTypeError,
     _analyze_home,
+    _url_text,
+    analyze_home,
+    async_url_data,
+    has_url_data_fields,
+    home_cache,
+    text_sample,
     url_data,
 )
+from lib.urls_jsonld import json_ld_data
 from tests import FakeResponse
 
 
@@ -672,20 +686,23 @@ def test_oth8():
 def test_oth10():
     """The Times. (Authors found by "byline" css selector)"""
     assert (
-        '* {{cite web '
-        '| last1=Lagan '
-        '| first1=Bernard '
-        '| last2=Charter '
-        '| first2=David '
-        '| title='
-        'Woman who lost brother on MH370 mourns relatives on board MH17 '
-        '| website=The Times & The Sunday Times '
-        '| date=2014-07-18 '
-        '| url=https://www.thetimes.co.uk/article/woman-who-lost-brother-on-mh370-mourns-relatives-on-board-mh17-r07q5rwppl0 '
-        '| access-date='
-    ) == urls_scr(
-        'https://www.thetimes.co.uk/article/woman-who-lost-brother-on-mh370-mourns-relatives-on-board-mh17-r07q5rwppl0'
-    )[1][:-12]
+        (
+            '* {{cite web '
+            '| last1=Lagan '
+            '| first1=Bernard '
+            '| last2=Charter '
+            '| first2=David '
+            '| title='
+            'Woman who lost brother on MH370 mourns relatives on board MH17 '
+            '| website=The Times '  # the publisher in JSON-LD
+            '| date=2014-07-18 '
+            '| url=https://www.thetimes.co.uk/article/woman-who-lost-brother-on-mh370-mourns-relatives-on-board-mh17-r07q5rwppl0 '
+            '| access-date='
+        )
+        == urls_scr(
+            'https://www.thetimes.co.uk/article/woman-who-lost-brother-on-mh370-mourns-relatives-on-board-mh17-r07q5rwppl0'
+        )[1][:-12]
+    )
 
 
 def test_oth11():
@@ -926,13 +943,21 @@ def test_find_website_meta_pipe():
     )
 
 
+BABEL_URL = 'https://babel.ua/en/news/94854-russia-submitted-a-statement-against-ukraine-to-the-international-criminal-court-kyiv-is-accused-of-destroying-the-kakhovka-hpp'
+
+
 def test_pipe_in_home_title_as_website():
     # https://meta.wikimedia.org/w/index.php?diff=next&oldid=25196965
-    scr = urls_scr(
-        'https://babel.ua/en/news/94854-russia-submitted-a-statement-against-ukraine-to-the-international-criminal-court-kyiv-is-accused-of-destroying-the-kakhovka-hpp'
-    )
+    # JSON-LD names the site Babel; without it, the home page title is used
+    with patch(
+        'lib.urls.json_ld_data',
+        side_effect=lambda html: {
+            k: v for k, v in json_ld_data(html).items() if k != 'website'
+        },
+    ):
+        scr = urls_scr(BABEL_URL)
     assert scr[1][:-12] == (
-        '* {{cite web | last=Telishevska | first=Sofiia | title=Russia submitted a statement against Ukraine to the International Criminal Court. Kyiv is accused of destroying the Kakhovka HPP | website=Бабель  | date=2023-06-08 | url=https://babel.ua/en/news/94854-russia-submitted-a-statement-against-ukraine-to-the-international-criminal-court-kyiv-is-accused-of-destroying-the-kakhovka-hpp | access-date='
+        f'* {{{{cite web | last=Telishevska | first=Sofiia | title=Russia submitted a statement against Ukraine to the International Criminal Court. Kyiv is accused of destroying the Kakhovka HPP | website=Бабель  | date=2023-06-08 | url={BABEL_URL} | access-date='
     )
 
 
@@ -975,7 +1000,7 @@ def test_citoid_thesis_invalid_doi(url_text: Mock):
 
 @patch('lib.urls.request', side_effect=CurlError('<test>'))
 def test__analyze_home_stream_request_raises_connect_error(_request_mock):
-    assert _analyze_home(('https', 'example.com'), []) is None
+    assert _analyze_home('https://example.com', []) is None
 
 
 def test_comma_in_site_name():
@@ -985,3 +1010,163 @@ def test_comma_in_site_name():
     assert scr[1][:-12] == (
         "* {{cite web | title=Minda Women's Golf Day | website=InDaily | date=2026-02-11 | url=https://www.indailysa.com.au/salife/out-about/2026/02/11/minda-womens-golf-day | ref={{sfnref|InDaily|2026}} | access-date="
     )
+
+
+def test_async_url_data_parses_on_asgi_executor():
+    async def url_text(url, _):
+        return url, '<html>'
+
+    with (
+        patch('lib.urls.async_url_text', url_text),
+        patch(
+            'lib.urls.url_data',
+            side_effect=lambda url, html: {'thread': current_thread().name},
+        ),
+    ):
+        d = asyncio.run(async_url_data('https://example.com/'))
+    assert d['thread'].startswith('asgi')
+
+
+def test_async_url_data_matches_url_data():
+    url = 'https://www.indailysa.com.au/salife/out-about/2026/02/11/minda-womens-golf-day'
+    assert asyncio.run(async_url_data(url)) == url_data(url)
+
+
+def test_decoded_size_budget_stops_reading_early():
+    chunks_read = []
+
+    def iter_content(_):
+        for i in range(100):
+            chunks_read.append(i)
+            yield b'a' * 1_000_000
+
+    r = FakeResponse('https://example.com/', b'', 200, {}, 'utf8')
+    with (
+        patch.object(FakeResponse, 'iter_content', iter_content),
+        patch('lib.urls.request', return_value=r),
+        raises(ContentLengthError),
+    ):
+        _url_text('https://example.com/')
+    assert len(chunks_read) == 11
+
+
+def test_streamed_body_stops_at_deadline():
+    chunks_read = []
+
+    def iter_content(_):
+        for i in range(100):
+            chunks_read.append(i)
+            if i == 3:  # the page drips past the deadline
+                deadline.expires = monotonic() - 1
+            yield b'a' * 1000
+
+    r = FakeResponse('https://example.com/', b'', 200, {}, 'utf8')
+    with (
+        patch.object(FakeResponse, 'iter_content', iter_content),
+        patch('lib.urls.request', return_value=r),
+        deadline_scope(Deadline(10)) as deadline,
+        raises(DeadlineExceeded),
+    ):
+        _url_text('https://example.com/')
+    assert len(chunks_read) == 4
+
+
+def test_html_reading_stops_after_head_and_body_window():
+    head = (
+        b'<html lang="en"><head>'
+        b'<meta property="og:title" content="T">'
+        b'<meta property="article:published_time" content="2020-01-02">'
+        b'<meta name="author" content="John Smith">'
+        b'</head><body>'
+    )
+    chunks_read = []
+
+    def iter_content(_):
+        yield head
+        for i in range(1000):
+            chunks_read.append(i)
+            yield b'a' * 1000
+
+    r = FakeResponse('https://example.com/', b'', 200, {}, 'utf8')
+    with (
+        patch.object(FakeResponse, 'iter_content', iter_content),
+        patch('lib.urls.request', return_value=r),
+    ):
+        _, html = _url_text('https://example.com/', has_url_data_fields)
+        assert len(chunks_read) == HTML_BODY_WINDOW // 1000 + 1
+        assert html.startswith(head.decode())
+
+        # without a date, the body may be needed; read the whole page
+        head = head.replace(b'article:published_time', b'x')
+        chunks_read.clear()
+        _url_text('https://example.com/', has_url_data_fields)
+        assert len(chunks_read) == 1000
+
+
+def test_incremental_decoding_sniffs_charset():
+    text = '<html><head><meta charset="windows-1256"></head>' + 'سلام' * 500
+
+    def iter_content(self):
+        content = self.content
+        for i in range(0, len(content), 7):  # split multi-byte sequences
+            yield content[i : i + 7]
+
+    r = FakeResponse(
+        'https://example.com/', text.encode('cp1256'), 200, {}, 'utf-8'
+    )
+    with (
+        patch.object(FakeResponse, 'iter_content', iter_content),
+        patch('lib.urls.request', return_value=r),
+    ):
+        assert _url_text('https://example.com/')[1] == text
+
+        # the charset of content-type header overrides <meta>
+        r.headers = {'content-type': 'text/html; charset=utf-8'}
+        r.content = text.encode()
+        assert _url_text('https://example.com/')[1] == text
+
+        # a byte order mark overrides both
+        r.content = text.encode('utf-16')
+        assert _url_text('https://example.com/')[1] == text
+
+        # pages shorter than SNIFF_LENGTH
+        r.headers = {}
+        r.content = b'<meta charset=latin-1>\xe9'
+        assert _url_text('https://example.com/')[1][-1] == 'é'
+
+
+def test_text_sample_is_bounded_visible_text():
+    html = (
+        '<html><head><style>p {color: red}</style></head>'
+        '<BODY><script>var x = "<p>code</p>";</script><!-- c -->'
+        '<p>Hello &amp;\n  world</p>' + '<p>word</p>' * 100_000
+    )
+    sample = text_sample(html, 'Title')
+    assert sample.startswith('Title\nHello & world word word')
+    assert len(sample) == len('Title\n') + LANG_SAMPLE_LENGTH
+
+
+def test_analyze_home_is_cached_per_host():
+    home_cache.clear()
+    html = (
+        '<meta property="og:site_name" content="Example"><title>Home</title>'
+    )
+    with patch(
+        'lib.urls.url_text', return_value=(None, html)
+    ) as url_text_mock:
+        thread, home_list = analyze_home(('https', 'example.org', '/a'))
+        thread.join()
+        assert home_list == ['Example', 'Home']
+        thread, home_list = analyze_home(('https', 'example.org', '/b'))
+        assert home_list == ['Example', 'Home']
+        # another scheme is another home page
+        analyze_home(('http', 'example.org', '/a'))[0].join()
+    assert url_text_mock.call_count == 2
+    home_cache.clear()
+
+    with (
+        patch.dict('lib.urls.home_seeds', {'https://example.org': ['S', 'T']}),
+        patch('lib.urls.url_text') as url_text_mock,
+    ):
+        assert analyze_home(('https', 'example.org', '/a'))[1] == ['S', 'T']
+    url_text_mock.assert_not_called()
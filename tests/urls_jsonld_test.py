@@ -0,0 +1,36 @@
+from datetime import date
+
+from lib.urls import headline_title
+from lib.urls_jsonld import json_ld_data
+
+
+def test_json_ld_data():
+    assert json_ld_data(
+        '<script type="application/ld+json">{invalid</script>'
+        '<script type="application/ld+json">'
+        '{"@context": "https://schema.org", "@graph": ['
+        '{"@type": "WebSite", "name": "Example"},'
+        '{"@type": ["NewsArticle"], "headline": "A &amp; B",'
+        '"datePublished": "2020-02-13T10:00:00+00:00",'
+        '"author": [{"@type": "Person", "name": "Jane Doe"},'
+        '{"@type": "Organization", "name": "Example Staff"}, "John Smith"],'
+        '"publisher": {"@type": "Organization", "name": "Example News"}}'
+        ']}</script>'
+    ) == {
+        'title': 'A &amp; B',
+        'authors': [('Jane', 'Doe')],  # not the plain string
+        'date': date(2020, 2, 13),
+        'website': 'Example News',
+    }
+    assert (
+        json_ld_data(
+            '<script type="application/ld+json">{"@type": "WebPage"}</script>'
+        )
+        == {}
+    )
+
+
+def test_headline_title():
+    assert headline_title('Opinion | A & B - Example', 'A &amp; B') == 'A & B'
+    assert headline_title('Opinion | A - Example', 'A B') is None
+    assert headline_title(None, 'A') is None
@@ -0,0 +1,40 @@
+from lib.urls_meta import lxml_meta_index, regex_meta_index
+
+
+def test_meta_index():
+    meta = regex_meta_index(
+        '<meta property="og:title" content="A">\n'
+        '<meta content="B" name="citation_publisher" data-x="y">\n'
+        '<meta name="DC.publisher" content="C">\n'
+        '<meta data-x="y" property="og:title" content="D">\n'
+        '<meta property ="og:site_name" content="E">\n'
+        '<meta name=author content="F">\n'
+        '<meta name="author" content="">\n'
+    )
+    assert meta.get('og:title') == 'A'
+    # the first tag with any of the names wins
+    assert meta.get('dc.publisher', 'citation_publisher') == 'B'
+    assert meta.entries(['og:title'], leading=True) == [(0, 'A')]
+    assert [c for _, c in meta.entries(['og:title'])] == ['A', 'D']
+    # names with spaces around `=` or without quotes are not exact
+    assert meta.get('og:site_name') is None
+    assert meta.get('author') is None
+    assert [c for _, c in meta.entries(['author'], exact=False)] == ['F']
+    assert meta.entries(lambda name: name.startswith('dc.')) == [
+        (meta.first(['dc.publisher'])[0], 'C')  # type: ignore
+    ]
+
+
+def test_lxml_meta_index():
+    meta = lxml_meta_index(
+        '<html><head>'
+        '<meta property="og:title" content="A &amp; B">'
+        '<meta name=author content="F"><meta name="author" content="G">\n'
+        '<meta property ="og:site_name" content="E">'
+        '</head><body><meta name="citation_doi" content="10.1/x">'
+    )
+    assert meta.get('og:title') == 'A & B'
+    assert [c for _, c in meta.entries(['author'])] == ['F', 'G']
+    assert meta.get('og:site_name') == 'E'
+    # tags after </head> are not indexed
+    assert meta.get('citation_doi') is None